@@ -0,0 +1,180 @@
+from skill.support import MultipleProjectilesSupport, SlowerProjectileSupport, HeavyDrawSupport
+from skill.skill import BowAttack
+from world.worldgen import WorldGenerator
+from world.world import World
+from vector import Vector2
+from entity import EnemyEntity, Player, ArrowEntity
+from goal import ShootAtPlayerGoal
+from pathfinding import a_star_pathfind, theta_star_pathfind, get_path_grid
+from affix import AffixDatabase
+from time import perf_counter
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import numpy
+
+AFFIX_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "affix_database.json")
+
+
+# times func(setup()) repeats times, running setup outside the timed region; returns seconds per call
+def _benchmark_time(func, setup=None, repeats=30, number=1):
+    samples = []
+    for _ in range(repeats):
+        state = setup() if setup is not None else None
+        start = perf_counter()
+        for _ in range(number):
+            func(state)
+        samples.append((perf_counter() - start) / number)
+    return samples
+
+
+def _benchmark_summary(samples):
+    values = numpy.array(samples)
+    return {
+        "samples": len(samples),
+        "mean": float(values.mean()),
+        "min": float(values.min()),
+        "p5": float(numpy.percentile(values, 5)),
+        "median": float(numpy.median(values)),
+        "p95": float(numpy.percentile(values, 95)),
+        "max": float(values.max())
+    }
+
+
+def _benchmark_world(seed, rooms=15) -> World:
+    random.seed(seed)
+    return WorldGenerator(rooms, Vector2(100, 100), Vector2(300, 300), 50).generate()
+
+
+# pairs of points for the path benchmarks: inside one zone, a couple of rooms apart and across the whole map
+def _benchmark_path_queries(world: World):
+    zones = world.zones
+    start_zone = zones[0]
+    short = (start_zone.bottom_left + Vector2(10, 10), start_zone.top_right - Vector2(10, 10))
+    neighbor = start_zone.get_neighbors()[0]
+    medium_zone = next((zone for zone in neighbor.get_neighbors() if zone is not start_zone), neighbor)
+    medium = (start_zone.center(), medium_zone.center())
+    farthest = max(((a, b) for a in zones for b in zones), key=lambda pair: pair[0].center().distance(pair[1].center()))
+    cross = (farthest[0].center(), farthest[1].center())
+    return {"short": short, "medium": medium, "cross": cross}
+
+
+def _benchmark_tick_setup(seed, enemies, arrows):
+    def setup():
+        world = _benchmark_world(seed)
+        player = Player(world)
+        player.god_mode = True
+        world.add_entity(player)
+        for _ in range(enemies):
+            zone = random.choice(world.zones)
+            enemy = EnemyEntity(world, Vector2(random.randint(zone.bottom_left.x, zone.top_right.x),
+                                               random.randint(zone.bottom_left.y, zone.top_right.y)))
+            enemy.add_goal(ShootAtPlayerGoal(enemy, player))
+            world.add_entity(enemy)
+        enemy_list = [entity for entity in world.entities if isinstance(entity, EnemyEntity)]
+        for _ in range(arrows):
+            source = random.choice(enemy_list)
+            direction = Vector2(random.uniform(-1, 1), random.uniform(-1, 1)).normalize()
+            world.add_entity(ArrowEntity(world, source.position, 100, direction, 400, source, 0))
+        return world
+    return setup
+
+
+def run_benchmarks(seed=1234, repeats=30, enemies=50, arrows=200):
+    results = dict()
+
+    random.seed(seed)
+    generator = WorldGenerator(15, Vector2(100, 100), Vector2(300, 300), 50)
+    results["worldgen.generate"] = _benchmark_time(lambda _: generator.generate(), lambda: random.seed(seed),
+                                                   repeats)
+
+    world = _benchmark_world(seed)
+    results["world.generate_map"] = _benchmark_time(lambda _: world._world_generate_map(), None, repeats)
+
+    # lattice is built once per world, so warm it up and only time the searches
+    get_path_grid(world)
+    for name, (start, goal) in _benchmark_path_queries(world).items():
+        results["pathfinding.a_star.%s" % name] = _benchmark_time(lambda _: a_star_pathfind(world, start, goal),
+                                                                  None, repeats)
+        results["pathfinding.theta_star.%s" % name] = _benchmark_time(
+            lambda _: theta_star_pathfind(world, start, goal), None, repeats)
+
+    results["world.tick.%de_%da" % (enemies, arrows)] = _benchmark_time(lambda tick_world: tick_world.tick_world(1 / 60),
+                                                                        _benchmark_tick_setup(seed, enemies, arrows),
+                                                                        repeats)
+
+    def bow_setup():
+        random.seed(seed)
+        source = Player(world)
+        source.active_supports = [MultipleProjectilesSupport(), SlowerProjectileSupport(), HeavyDrawSupport()]
+        world.entities.clear()
+        return source
+    bow = BowAttack()
+    results["skill.bow_attack.stacked_supports"] = _benchmark_time(lambda source: bow.use(world, source, Vector2(1, 0)),
+                                                                   bow_setup, repeats, 100)
+    world.entities.clear()
+
+    affix_db = AffixDatabase()
+    affix_db.load_file(AFFIX_DATABASE)
+    numpy.random.seed(seed)
+    results["affix.get_random_mods"] = _benchmark_time(lambda _: affix_db.get_random_mods(True, 3), None, repeats, 100)
+
+    return {name: _benchmark_summary(samples) for name, samples in results.items()}
+
+
+# ratio of median against a stored baseline; anything above 1 + threshold counts as a regression
+def compare(results, baseline, threshold=0.1):
+    regressions = []
+    for name, summary in results.items():
+        if name not in baseline:
+            continue
+        ratio = summary["median"] / baseline[name]["median"]
+        marker = ""
+        if ratio > 1 + threshold:
+            marker = "  <-- regression"
+            regressions.append(name)
+        print("%-40s %10.3f ms  (baseline %10.3f ms, x%.2f)%s" % (name, summary["median"] * 1000,
+                                                                  baseline[name]["median"] * 1000, ratio, marker))
+    return regressions
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Time the simulation hot paths with fixed seeds.")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--enemies", type=int, default=50)
+    parser.add_argument("--arrows", type=int, default=200)
+    parser.add_argument("--output", help="write the results as json to this file")
+    parser.add_argument("--baseline", help="json file from an earlier --output run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed median slowdown before flagging")
+    args = parser.parse_args()
+
+    summaries = run_benchmarks(args.seed, args.repeats, args.enemies, args.arrows)
+    report = {
+        "meta": {
+            "seed": args.seed,
+            "repeats": args.repeats,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "numpy": numpy.__version__,
+            "machine": platform.machine()
+        },
+        "results": summaries
+    }
+
+    for name, summary in summaries.items():
+        print("%-40s median %10.3f ms  p95 %10.3f ms  max %10.3f ms" % (name, summary["median"] * 1000,
+                                                                        summary["p95"] * 1000, summary["max"] * 1000))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline_results = json.load(file)["results"]
+        print()
+        if compare(summaries, baseline_results, args.threshold):
+            exit(1)
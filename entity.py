@@ -1,35 +1,44 @@
 from vector import Vector2
 from shape import Rectangle
+from pool import EntityPool
 import goal
 
-HALF = Vector2(0.5, 0.5)
-
-
-# calculates velocity of entity with respect to a maximum speed
-def _entity_calculate_velocity(acceleration: Vector2, current_velocity: Vector2, maximum: Vector2):
-    new_velocity = current_velocity + acceleration
-    new_velocity.x = min(new_velocity.x, maximum.x)
-    new_velocity.y = min(new_velocity.y, maximum.y)
-    return new_velocity
-
 
 # base of a body with physics
+# attached to a world's physics store, a body is switched to a subclass whose vectors are views into its rows
+# (see world.physics) and which the store integrates instead of tick_physics
 class PhysicsBody:
     def __init__(self, position=Vector2(0, 0), maximum_speed=100, drag=0.9, size=Vector2(10, 10)):
-        self.position = position
-        self.acceleration = self.velocity = Vector2(0, 0)
+        self.physics_store = None
+        self.physics_row = -1
+        # vectors are mutated in place from here on, so never share them with the caller or each other
+        self.position = position.clone()
+        self.acceleration = Vector2(0, 0)
+        self.velocity = Vector2(0, 0)
         self.maximum_speed = Vector2(maximum_speed, maximum_speed)
         self.drag = Vector2(drag, drag)
         self.size = size
 
     def tick_physics(self, dt):
-        old_velocity = self.velocity.clone()
-        new_velocity = _entity_calculate_velocity(self.acceleration, old_velocity, self.maximum_speed)
-        self.position += ((old_velocity + new_velocity) * HALF) * Vector2(dt, dt)
+        # average of the old velocity and the capped new one, done on floats to avoid temporary vectors
+        velocity, acceleration, maximum = self.velocity, self.acceleration, self.maximum_speed
+        new_x = min(velocity.x + acceleration.x, maximum.x)
+        new_y = min(velocity.y + acceleration.y, maximum.y)
+        position = self.position
+        position.x += (velocity.x + new_x) * 0.5 * dt
+        position.y += (velocity.y + new_y) * 0.5 * dt
 
 
 # base entity
 class Entity(PhysicsBody):
+    # projectiles are left out of the world's spatial hash
+    is_projectile = False
+    # set while the entity is on loan from an EntityPool
+    pool = None
+    # generational handle and dense list position, both handed out by the world's EntityList
+    handle = None
+    entity_index = -1
+
     def __init__(self, world, position=Vector2(0, 0), maximum_speed=100, drag=0.85, maximum_health=1000):
         super(Entity, self).__init__(position, maximum_speed, drag=drag)
         self.world = world
@@ -49,6 +58,17 @@ class Entity(PhysicsBody):
         # tick physics
         self.tick_physics(dt)
 
+    # dropping to 0 health queues the entity for the world's next sweep
+    @property
+    def health(self):
+        return self._health
+
+    @health.setter
+    def health(self, value):
+        self._health = value
+        if value <= 0 and self.world is not None:
+            self.world.entities.mark_dying(self)
+
     # use goal_key to avoid duplicate goals
     def add_goal(self, goal):
         self.goals[goal.goal_key()] = goal
@@ -59,6 +79,13 @@ class Entity(PhysicsBody):
             path_goal = goal.FollowPathGoal(self, path)
             self.add_goal(path_goal)
 
+    # drops references a pooled entity shouldn't keep alive while it waits to be reused
+    def recycle(self):
+        self.world = None
+        self.goals.clear()
+        self.active_supports.clear()
+        self.planning = None
+
     # adds or removes a support if it exists or not
     def toggle_support(self, support):
         index = -1
@@ -82,12 +109,33 @@ class EnemyEntity(Entity):
 
 # arrow entity - not really an "entity", but a semi-hack to introduce physics based arrows
 class ArrowEntity(Entity):
+    is_projectile = True
+
     def __init__(self, world, position, maximum_speed, direction, damage, source, pierce_count):
         super(ArrowEntity, self).__init__(world, position, maximum_speed, 1)
+        # handles rather than entities, so a recycled slot never counts as already hit
+        self.already_hit = set()
+        self._arrow_aim(direction, damage, source, pierce_count)
+
+    # re-initializes a pooled arrow in place, reusing its vectors and lists
+    def reset(self, world, position, maximum_speed, direction, damage, source, pierce_count):
+        self.world = world
+        self.position.set(position.x, position.y)
+        self.velocity.set(0, 0)
+        self.maximum_speed.set(maximum_speed, maximum_speed)
+        self.drag.set(1, 1)
+        self.health = self.maximum_health
+        self._arrow_aim(direction, damage, source, pierce_count)
+
+    def recycle(self):
+        super(ArrowEntity, self).recycle()
+        self.source = None
+        self.already_hit.clear()
+
+    def _arrow_aim(self, direction, damage, source, pierce_count):
         self.damage = damage
         self.source = source
-        self.acceleration = direction * self.maximum_speed
-        self.already_hit = list()
+        self.acceleration.set(direction.x * self.maximum_speed.x, direction.y * self.maximum_speed.y)
         if isinstance(source, Player):
             self.color = (255, 255, 255)
         else:
@@ -103,10 +151,10 @@ class ArrowEntity(Entity):
     def tick_entity(self, dt):
         colliding = self.get_colliding_entities()
         # check if we hit something
-        if colliding and colliding[0] is not self.source and colliding[0] not in self.already_hit:
+        if colliding and colliding[0] is not self.source and colliding[0].handle not in self.already_hit:
             # we did! deal damage and don't hit again
             self.deal_damage(colliding[0])
-            self.already_hit.append(colliding[0])
+            self.already_hit.add(colliding[0].handle)
             # check if we can pierce; if we can, don't die.
             if self.pierce_count > 0:
                 self.pierce_count -= 1
@@ -121,11 +169,7 @@ class ArrowEntity(Entity):
     def get_colliding_entities(self):
         box = Rectangle(Vector2(self.position.x - (self.size.x / 2), self.position.y - (self.size.y / 2)),
                         Vector2(self.position.x + (self.size.x / 2), self.position.y + (self.size.y / 2)))
-        entities = list()
-        for entity in self.world.entities:
-            if entity is not self and not isinstance(entity, ArrowEntity) and entity.position in box:
-                entities.append(entity)
-        return entities
+        return self.world.get_entities_in(box)
 
 
 # represents a player entity
@@ -144,3 +188,7 @@ class Player(Entity):
         # add passive regen
         self.health = min(self.health + 5, self.maximum_health)
         super(Player, self).tick_entity(dt)
+
+
+# arrows live for about a second, so they're recycled instead of reallocated
+arrow_pool = EntityPool(ArrowEntity, 1024)
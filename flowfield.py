@@ -0,0 +1,124 @@
+from vector import Vector2
+from heapq import heappush, heappop
+from world.world import World
+from pathfinding import PathGrid, get_path_grid, _PATHFINDING_MOVES
+from array import array
+from math import floor
+import weakref
+
+# flow cells store 0 for "no direction" or 1 + the index of the move that leads towards the target
+_FLOWFIELD_DIRECTIONS = [Vector2(0, 0)] + [Vector2(dx, dy).normalize() for dx, dy, _ in _PATHFINDING_MOVES]
+_FLOWFIELD_REVERSE = [0] + [1 + _PATHFINDING_MOVES.index((-dx, -dy, cost)) for dx, dy, cost in _PATHFINDING_MOVES]
+
+
+# a dijkstra fill outward from the target's lattice cell; every reached cell remembers which way to step.
+# a new fill only starts once the previous one is done and the target has changed cell since,
+# and each fill is spread over ticks by a node budget while entities keep sampling the last finished field.
+# the lattice is twice as coarse as a_star_pathfind's, since a fill covers the whole world rather than one route:
+# the narrowest zones (50 unit streaming corridors, 100+ unit generated rooms) still get at least 4 nodes across,
+# so every zone keeps nodes and the lattice stays connected wherever the zones are
+class FlowField:
+    def __init__(self, world: World, target, step=10, budget=1500):
+        self.world = world
+        # weak, so a field never keeps its target (or the target's world) alive by itself
+        self._target = weakref.ref(target)
+        self.grid = get_path_grid(world, step)
+        self.budget = budget
+        self.flow = None
+        # the lattice flow was filled on, which lags behind grid while the world is changing
+        self.flow_grid = None
+        self.target_cell = -1
+        self.last_tick = -1
+        self._pending = None
+
+    # advances the field; cheap to call from every chaser since it only does work once per world tick
+    def update(self):
+        if self.last_tick == self.world.tick_count:
+            return
+        self.last_tick = self.world.tick_count
+
+        # the world's zones changed under us: refill on the new lattice, steering by the last field until that's done.
+        # that one is only out of date in the chunks that just came or went, and those are away from every entity
+        if self.grid.revision != self.world.revision:
+            self.grid = get_path_grid(self.world, self.grid.step)
+            self.target_cell = -1
+            self._pending = None
+
+        if self._pending is None:
+            target = self._target()
+            if target is None:
+                return
+            cell = self.grid.snap(target.position)
+            if cell == -1 or cell == self.target_cell:
+                return
+            self.target_cell = cell
+            self._pending = _FlowFieldSearch(self.grid, cell)
+
+        if self._pending.expand(self.budget):
+            self.flow = self._pending.flow
+            self.flow_grid = self._pending.grid
+            self._pending = None
+
+    # direction to walk from position, zero if there's no field yet or the cell isn't reached
+    # (or is the target's own cell)
+    def sample(self, position: Vector2) -> Vector2:
+        if self.flow is None:
+            return _FLOWFIELD_DIRECTIONS[0]
+        grid = self.flow_grid
+        x = int(floor((position.x - grid.origin.x) / grid.step + 0.5))
+        y = int(floor((position.y - grid.origin.y) / grid.step + 0.5))
+        if x < 0 or y < 0 or x >= grid.width or y >= grid.height:
+            return _FLOWFIELD_DIRECTIONS[0]
+        return _FLOWFIELD_DIRECTIONS[self.flow[y * grid.width + x]]
+
+
+# resumable dijkstra state for one fill
+class _FlowFieldSearch:
+    def __init__(self, grid: PathGrid, source: int):
+        self.grid = grid
+        node_count = grid.width * grid.height
+        self.distance = array("d", [float("inf")]) * node_count
+        self.flow = bytearray(node_count)
+        self.closed = bytearray(node_count)
+        self.distance[source] = 0.0
+        self.open_nodes = [(0.0, source)]
+
+    # expands up to budget nodes (everything if budget < 0); returns True once the fill is complete
+    def expand(self, budget: int) -> bool:
+        grid = self.grid
+        width, height, walkable = grid.width, grid.height, grid.walkable
+        distance, flow, closed, open_nodes = self.distance, self.flow, self.closed, self.open_nodes
+
+        while open_nodes and budget != 0:
+            d_current, current = heappop(open_nodes)
+            if closed[current]:
+                continue
+            closed[current] = 1
+            budget -= 1
+
+            y, x = divmod(current, width)
+            for move, (dx, dy, cost) in enumerate(_PATHFINDING_MOVES):
+                nx, ny = x + dx, y + dy
+                if nx < 0 or ny < 0 or nx >= width or ny >= height:
+                    continue
+                neighbor = ny * width + nx
+                if closed[neighbor] or not walkable[neighbor]:
+                    continue
+                if dx and dy and not (walkable[y * width + nx] and walkable[ny * width + x]):
+                    continue
+                d_neighbor = d_current + cost
+                if d_neighbor < distance[neighbor]:
+                    distance[neighbor] = d_neighbor
+                    # the neighbor walks back along the move we just made
+                    flow[neighbor] = _FLOWFIELD_REVERSE[move + 1]
+                    heappush(open_nodes, (d_neighbor, neighbor))
+
+        return not open_nodes
+
+
+# one field per target, kept on the world and shared by everything chasing that target
+def get_flow_field(world: World, target, step=10) -> FlowField:
+    field = world.flow_fields.get(target)
+    if field is None or field.grid.step != step:
+        field = world.flow_fields[target] = FlowField(world, target, step)
+    return field
@@ -1,10 +1,18 @@
 from abc import abstractmethod, ABC
-from vector import Vector2
+from vector import Vector2, Vector2Array
 from typing import List
+from math import sqrt
 from pathfinding import a_star_pathfind
+from flowfield import get_flow_field
+from raycast import has_line_of_sight, lines_of_sight
+from weakref import WeakKeyDictionary, WeakSet
 from skill import skill, support
 
 
+# shooters registered per world, see _ShooterSight
+_goal_sights = WeakKeyDictionary()
+
+
 # an abstract goal class
 class Goal(ABC):
 
@@ -36,10 +44,17 @@ class FollowPathGoal(Goal):
 
     def tick_goal(self):
         # take a step and multiple by maximum speed, then set acceleration
-        step = (self.current_target - self.entity.position).normalize()
-        self.entity.acceleration = step * self.entity.maximum_speed
+        position = self.entity.position
+        dx = self.current_target.x - position.x
+        dy = self.current_target.y - position.y
+        distance = sqrt(dx * dx + dy * dy)
+        if distance == 0:
+            self.entity.acceleration = Vector2(0, 0)
+        else:
+            maximum = self.entity.maximum_speed
+            self.entity.acceleration = Vector2(dx / distance * maximum.x, dy / distance * maximum.y)
         # check if we're close
-        if self.entity.position.distance(self.current_target) < self.inaccuracy:
+        if distance < self.inaccuracy:
             if self.path:
                 self.current_target = self.path.pop()
             else:
@@ -47,12 +62,40 @@ class FollowPathGoal(Goal):
 
     def cleanup(self):
         # reset physics
-        self.entity.velocity = self.entity.acceleration = Vector2(0, 0)
+        self.entity.velocity = Vector2(0, 0)
+        self.entity.acceleration = Vector2(0, 0)
 
     def goal_key(self):
         return "follow_path"
 
 
+# shooters of one world that are due to fire on the same tick get their line of sight to their targets cast together.
+# whichever asks first casts for every due shooter that hasn't ticked yet; shooters are held weakly,
+# so they drop out once their goal is gone
+class _ShooterSight:
+    def __init__(self):
+        self.shooters = WeakSet()
+        self.tick = -1
+
+    def resolve(self, world):
+        if self.tick == world.tick_count:
+            return
+        self.tick = world.tick_count
+        due = [shooter for shooter in self.shooters if shooter.due() and shooter.entity.health > 0]
+        starts = Vector2Array.from_vectors([shooter.entity.position for shooter in due])
+        ends = Vector2Array.from_vectors([shooter.player.position for shooter in due])
+        for shooter, visible in zip(due, lines_of_sight(world, starts, ends).tolist()):
+            shooter.in_sight = visible
+            shooter.sight_tick = world.tick_count
+
+
+def _goal_shooter_sight(world) -> _ShooterSight:
+    sight = _goal_sights.get(world)
+    if sight is None:
+        sight = _goal_sights[world] = _ShooterSight()
+    return sight
+
+
 class ShootAtPlayerGoal(Goal):
 
     def __init__(self, entity, player):
@@ -60,18 +103,66 @@ class ShootAtPlayerGoal(Goal):
         self.player = player
         self.last_goal = None
         self.tick_count = 0
+        # line of sight to the player and the world tick it was cast on, filled in by the world's _ShooterSight
+        self.in_sight = False
+        self.sight_tick = -1
         self.entity.active_supports = [support.MultipleProjectilesSupport()]
         self.skill = skill.BowAttack()
+        _goal_shooter_sight(entity.world).shooters.add(self)
 
     def has_completed(self):
         return self.player.health <= 0
 
+    # only every 100 ticks to prevent massive spam
+    def due(self):
+        return self.tick_count % 100 == 0
+
     def tick_goal(self):
-        # only every 100 ticks to prevent massive spam
-        if self.tick_count % 100 == 0:
-            # just shoot at them!
-            self.skill.use(self.entity.world, self.entity, (self.player.position - self.entity.position).normalize())
+        if self.due():
+            # arrows die as soon as they leave the world, so don't waste any on a player behind a wall
+            world = self.entity.world
+            sight = _goal_shooter_sight(world)
+            sight.resolve(world)
+            if self.sight_tick != world.tick_count:
+                # not one of this world's shooters yet (the entity moved worlds), so cast just for us this time
+                sight.shooters.add(self)
+                self.in_sight = has_line_of_sight(world, self.entity.position, self.player.position)
+            if self.in_sight:
+                # just shoot at them!
+                self.skill.use(world, self.entity, (self.player.position - self.entity.position).normalize())
         self.tick_count += 1
 
     def goal_key(self):
         return "attack_player"
+
+
+class ChaseGoal(Goal):
+
+    def __init__(self, entity, target, keep_distance=60):
+        self.entity = entity
+        self.target = target
+        self.keep_distance = keep_distance
+        # every chaser of the same target samples the same field
+        self.field = get_flow_field(entity.world, target)
+
+    def has_completed(self):
+        return self.target.health <= 0
+
+    def tick_goal(self):
+        self.field.update()
+        distance = self.entity.position.distance(self.target.position)
+        if distance < self.keep_distance:
+            self.entity.acceleration = Vector2(0, 0)
+            return
+        step = self.field.sample(self.entity.position)
+        # same cell as the target (or off the field), just head straight for it
+        if step.x == 0 and step.y == 0:
+            step = (self.target.position - self.entity.position).normalize()
+        self.entity.acceleration = step * self.entity.maximum_speed
+
+    def cleanup(self):
+        self.entity.velocity = Vector2(0, 0)
+        self.entity.acceleration = Vector2(0, 0)
+
+    def goal_key(self):
+        return "chase"
@@ -0,0 +1,130 @@
+from skill.support import MultipleProjectilesSupport
+from skill.skill import BowAttack
+from world.worldgen import WorldGenerator
+from world.world import World
+from world.streaming import StreamingWorld
+from vector import Vector2
+from entity import EnemyEntity, Player
+from goal import ChaseGoal, ShootAtPlayerGoal
+from navmesh import navmesh_pathfind
+from time import perf_counter
+import argparse
+import logging
+import random
+
+
+# a player that wanders between random zones and shoots the closest enemy, standing in for mouse input
+class ScriptedPlayer:
+    def __init__(self, world: World, player: Player, wander_every=180, shoot_every=30):
+        self.world = world
+        self.player = player
+        self.wander_every = wander_every
+        self.shoot_every = shoot_every
+        self.ticks = 0
+
+    def tick(self):
+        if self.player.health <= 0:
+            return
+        if self.ticks % self.wander_every == 0:
+            zone = random.choice(self.world.zones)
+            self.player.follow_path(navmesh_pathfind(self.world, self.player.position, zone.center()))
+        if self.ticks % self.shoot_every == 0:
+            target = self._closest_enemy()
+            if target is not None:
+                direction = (target.position - self.player.position).normalize()
+                self.player.skill.use(self.world, self.player, direction)
+        self.ticks += 1
+
+    def _closest_enemy(self):
+        closest, closest_distance = None, None
+        for entity in self.world.entities:
+            if isinstance(entity, EnemyEntity):
+                distance = entity.position.distance(self.player.position, squared=True)
+                if closest_distance is None or distance < closest_distance:
+                    closest, closest_distance = entity, distance
+        return closest
+
+
+def spawn_enemies(world: World, player: Player, count: int):
+    for i in range(count):
+        # same spawning rules as the game: a random spot inside a random zone
+        random_zone = random.choice(world.zones)
+        spawning_location = Vector2(
+            random.randint(random_zone.bottom_left.x, random_zone.top_right.x),
+            random.randint(random_zone.bottom_left.y, random_zone.top_right.y),
+        )
+        enemy = EnemyEntity(world, spawning_location)
+        enemy.add_goal(ChaseGoal(enemy, player))
+        enemy.add_goal(ShootAtPlayerGoal(enemy, player))
+        world.add_entity(enemy)
+
+
+# the store integrates rows, not entities: fails if changing an attached entity's vectors in place didn't reach its row
+def check_store(world: World, player: Player):
+    row = world.physics.velocity[player.physics_row]
+    before = row.tolist()
+    player.velocity.x += 1
+    player.velocity += Vector2(0, 1)
+    moved = row.tolist()
+    player.velocity.set(*before)
+    if moved != [before[0] + 1, before[1] + 1]:
+        raise RuntimeError("in-place changes to an attached entity missed the physics store")
+
+
+# builds a world and steps it at a fixed dt as fast as possible; returns ticks per second
+def run(ticks=3600, dt=1 / 60, rooms=15, enemies=25, seed=0, entity_store=False, god_mode=True, streaming=False):
+    random.seed(seed)
+    if streaming:
+        world = StreamingWorld(seed, entity_store=entity_store)
+    else:
+        world = WorldGenerator(rooms, Vector2(100, 100), Vector2(300, 300), 50).generate(entity_store=entity_store)
+
+    player = Player(world, world.spawn_point() if streaming else Vector2(0, 0))
+    player.skill = BowAttack()
+    player.active_supports = [MultipleProjectilesSupport()]
+    player.god_mode = god_mode
+    world.add_entity(player)
+    if entity_store:
+        check_store(world, player)
+    spawn_enemies(world, player, enemies)
+    script = ScriptedPlayer(world, player)
+
+    peak_entities = 0
+    start = perf_counter()
+    for _ in range(ticks):
+        script.tick()
+        world.tick_world(dt)
+        peak_entities = max(peak_entities, len(world.entities))
+    elapsed = perf_counter() - start
+
+    tps = ticks / elapsed if elapsed > 0 else float("inf")
+    print("ticks: %d in %.3fs (%.1f ticks/s, %.1fx real time)" % (ticks, elapsed, tps, tps * dt))
+    print("entities: %d at the end, %d at peak; score: %d" % (len(world.entities), peak_entities, player.score))
+    return tps
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="[%(levelname)s @ %(name)s.%(funcName)s:%(lineno)s] %(message)s",
+                        level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Run the simulation without a window at a fixed timestep.")
+    parser.add_argument("--ticks", type=int, default=3600)
+    parser.add_argument("--dt", type=float, default=1 / 60)
+    parser.add_argument("--rooms", type=int, default=15)
+    parser.add_argument("--enemies", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--entity-store", action="store_true", help="integrate physics through the array store")
+    parser.add_argument("--streaming", action="store_true", help="generate chunks around the action instead of --rooms")
+    parser.add_argument("--mortal", action="store_true", help="let the scripted player die")
+    parser.add_argument("--profile", action="store_true", help="print the hottest functions afterwards")
+    args = parser.parse_args()
+
+    options = dict(ticks=args.ticks, dt=args.dt, rooms=args.rooms, enemies=args.enemies, seed=args.seed,
+                   entity_store=args.entity_store, god_mode=not args.mortal, streaming=args.streaming)
+    if args.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.runcall(run, **options)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    else:
+        run(**options)
@@ -0,0 +1,174 @@
+from vector import Vector2, Direction
+from heapq import heappush, heappop
+from world.world import World, Zone
+from typing import List, Optional, Tuple
+from math import sqrt
+from weakref import WeakKeyDictionary
+
+# navmeshes are cached per world, like the pathfinding lattices
+_navmesh_cache = WeakKeyDictionary()
+
+
+# shared edge between a zone and one of its neighbors.
+# left/right are as seen when walking from zone into neighbor
+class Portal:
+    def __init__(self, zone: Zone, neighbor: Zone, direction: Direction):
+        self.zone = zone
+        self.neighbor = neighbor
+        if direction is Direction.NORTH or direction is Direction.SOUTH:
+            y = zone.top_right.y if direction is Direction.NORTH else zone.bottom_left.y
+            low = (max(zone.bottom_left.x, neighbor.bottom_left.x), y)
+            high = (min(zone.top_right.x, neighbor.top_right.x), y)
+            # walking north, the lower x is on our left
+            self.left, self.right = (low, high) if direction is Direction.NORTH else (high, low)
+        else:
+            x = zone.top_right.x if direction is Direction.EAST else zone.bottom_left.x
+            low = (x, max(zone.bottom_left.y, neighbor.bottom_left.y))
+            high = (x, min(zone.top_right.y, neighbor.top_right.y))
+            # walking east, the higher y is on our left
+            self.left, self.right = (high, low) if direction is Direction.EAST else (low, high)
+        self.middle = ((self.left[0] + self.right[0]) / 2, (self.left[1] + self.right[1]) / 2)
+
+    # portal endpoints pulled in by margin on both ends so agents don't hug corners
+    def shrunk(self, margin: float) -> Tuple[tuple, tuple]:
+        dx = self.right[0] - self.left[0]
+        dy = self.right[1] - self.left[1]
+        length = sqrt(dx * dx + dy * dy)
+        if length <= 2 * margin:
+            return self.middle, self.middle
+        dx, dy = dx / length * margin, dy / length * margin
+        return (self.left[0] + dx, self.left[1] + dy), (self.right[0] - dx, self.right[1] - dy)
+
+
+# every zone is a node, every shared edge between linked neighbors is a portal
+class NavMesh:
+    def __init__(self, world: World):
+        self.revision = world.revision
+        self.zones = world.zones
+        self.zone_index = {zone: index for index, zone in enumerate(self.zones)}
+        self.portals = [list() for _ in self.zones]  # type: List[List[Tuple[int, Portal]]]
+        for index, zone in enumerate(self.zones):
+            for direction, neighbor in zone.neighbors.items():
+                if neighbor is not None and neighbor in self.zone_index:
+                    self.portals[index].append((self.zone_index[neighbor], Portal(zone, neighbor, direction)))
+
+    # A* over the zone graph; returns the portals crossed in order, or None if unreachable
+    def find_corridor(self, start_zone: int, goal_zone: int, start: tuple, goal: tuple) -> Optional[List[Portal]]:
+        # g-scores are measured along portal midpoints, which is good enough to pick the corridor
+        entry = {start_zone: start}
+        g_score = {start_zone: 0.0}
+        parent = {start_zone: None}
+        closed = set()
+        open_nodes = [(_navmesh_distance(start, goal), start_zone)]
+
+        while open_nodes:
+            _, current = heappop(open_nodes)
+            if current in closed:
+                continue
+            if current == goal_zone:
+                corridor = []
+                while parent[current] is not None:
+                    current, portal = parent[current]
+                    corridor.append(portal)
+                corridor.reverse()
+                return corridor
+            closed.add(current)
+
+            for neighbor, portal in self.portals[current]:
+                if neighbor in closed:
+                    continue
+                g_neighbor = g_score[current] + _navmesh_distance(entry[current], portal.middle)
+                if neighbor not in g_score or g_neighbor < g_score[neighbor]:
+                    g_score[neighbor] = g_neighbor
+                    entry[neighbor] = portal.middle
+                    parent[neighbor] = (current, portal)
+                    heappush(open_nodes, (g_neighbor + _navmesh_distance(portal.middle, goal), neighbor))
+        return None
+
+
+def get_navmesh(world: World) -> NavMesh:
+    navmesh = _navmesh_cache.get(world)
+    if navmesh is None or navmesh.revision != world.revision:
+        navmesh = _navmesh_cache[world] = NavMesh(world)
+    return navmesh
+
+
+def _navmesh_distance(p1: tuple, p2: tuple) -> float:
+    dx = p2[0] - p1[0]
+    dy = p2[1] - p1[1]
+    return sqrt(dx * dx + dy * dy)
+
+
+# twice the signed area of the triangle; positive when c is counter-clockwise of a -> b
+def _navmesh_triarea2(a: tuple, b: tuple, c: tuple) -> float:
+    ax = b[0] - a[0]
+    ay = b[1] - a[1]
+    bx = c[0] - a[0]
+    by = c[1] - a[1]
+    return ax * by - bx * ay
+
+
+# simple stupid funnel algorithm: pulls the string tight through a list of (left, right) portals
+def _navmesh_string_pull(portals: List[Tuple[tuple, tuple]]) -> List[tuple]:
+    apex = left = right = portals[0][0]
+    apex_index = left_index = right_index = 0
+    points = [apex]
+
+    i = 1
+    while i < len(portals):
+        portal_left, portal_right = portals[i]
+
+        # try to narrow the funnel from the right
+        if _navmesh_triarea2(apex, right, portal_right) >= 0:
+            if apex == right or _navmesh_triarea2(apex, left, portal_right) < 0:
+                right, right_index = portal_right, i
+            else:
+                # right crossed over left, so left becomes a corner of the path
+                apex, apex_index = left, left_index
+                points.append(apex)
+                left = right = apex
+                left_index = right_index = apex_index
+                i = apex_index + 1
+                continue
+
+        # try to narrow the funnel from the left
+        if _navmesh_triarea2(apex, left, portal_left) <= 0:
+            if apex == left or _navmesh_triarea2(apex, right, portal_left) > 0:
+                left, left_index = portal_left, i
+            else:
+                apex, apex_index = right, right_index
+                points.append(apex)
+                left = right = apex
+                left_index = right_index = apex_index
+                i = apex_index + 1
+                continue
+
+        i += 1
+
+    goal = portals[-1][0]
+    if points[-1] != goal:
+        points.append(goal)
+    return points
+
+
+# same contract as a_star_pathfind: goal first, start excluded
+def navmesh_pathfind(world: World, start: Vector2, goal: Vector2, margin=5) -> List[Vector2]:
+    start_zone = world.get_zone_containing_point(start)
+    goal_zone = world.get_zone_containing_point(goal)
+    if start_zone is None or goal_zone is None:
+        print("err: start or goal not in world")
+        return []
+
+    navmesh = get_navmesh(world)
+    start_point, goal_point = (start.x, start.y), (goal.x, goal.y)
+    corridor = navmesh.find_corridor(navmesh.zone_index[start_zone], navmesh.zone_index[goal_zone],
+                                     start_point, goal_point)
+    if corridor is None:
+        print("err: no path found")
+        return []
+
+    portals = [(start_point, start_point)]
+    portals.extend(portal.shrunk(margin) for portal in corridor)
+    portals.append((goal_point, goal_point))
+    points = _navmesh_string_pull(portals)
+    return [Vector2(x, y) for x, y in reversed(points[1:])]
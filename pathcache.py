@@ -0,0 +1,102 @@
+from vector import Vector2
+from world.world import World
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Callable, Optional
+from math import floor
+from raycast import has_line_of_sight
+import weakref
+
+
+# bounded LRU of paths keyed on quantized (start cell, goal cell). a hit is only used if it stitches cleanly onto
+# the exact start and goal, otherwise it counts as a miss and the path is searched again.
+# the cache remembers which world it was filled for and empties itself when that's replaced. when the world itself
+# changes (a streaming world loading chunks) only the paths running through the changed areas are dropped
+class PathCache:
+    def __init__(self, pathfind: Callable[[World, Vector2, Vector2], List[Vector2]], capacity=256, quantum=25):
+        self.pathfind = pathfind
+        self.capacity = capacity
+        self.quantum = quantum
+        self.hits = 0
+        self.misses = 0
+        self._paths = OrderedDict()
+        self._world = None
+        self._revision = -1
+        # paths are requested from the pathfinding pool threads
+        self._lock = Lock()
+
+    def find_path(self, world: World, start: Vector2, goal: Vector2) -> List[Vector2]:
+        key = self._key(start) + self._key(goal)
+        revision = world.revision
+        with self._lock:
+            if self._world is None or self._world() is not world:
+                self._paths.clear()
+                self._world = weakref.ref(world)
+                self._revision = revision
+            elif self._revision != revision:
+                self._pathcache_forget(world.changes_since(self._revision))
+                self._revision = revision
+            cached = self._paths.get(key)
+
+        path = _pathcache_stitch(world, cached[0], start, goal) if cached is not None else None
+        with self._lock:
+            if path is not None:
+                if key in self._paths:
+                    self._paths.move_to_end(key)
+                self.hits += 1
+                return path
+            self.misses += 1
+
+        path = self.pathfind(world, start, goal)
+        if path:
+            with self._lock:
+                # a path searched on a world that has changed since could cross an area that was just dropped
+                if self._world() is world and self._revision == revision == world.revision:
+                    xs = [waypoint.x for waypoint in path]
+                    ys = [waypoint.y for waypoint in path]
+                    self._paths[key] = (tuple(waypoint.clone() for waypoint in path),
+                                        (min(xs), min(ys), max(xs), max(ys)))
+                    while len(self._paths) > self.capacity:
+                        self._paths.popitem(last=False)
+        return path
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+            self._world = None
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        return len(self._paths)
+
+    # cells are in world coordinates, so they stay put when a streaming world's bounds move
+    def _key(self, point: Vector2) -> tuple:
+        return int(floor(point.x / self.quantum)), int(floor(point.y / self.quantum))
+
+    # drops the paths whose waypoints' bounding box touches one of areas, or everything if areas is None.
+    # the legs from the start and into the goal are re-checked on every hit anyway
+    def _pathcache_forget(self, areas):
+        if areas is None:
+            self._paths.clear()
+            return
+        for key, (_, (x0, y0, x1, y1)) in list(self._paths.items()):
+            for low, high in areas:
+                if x0 <= high.x and low.x <= x1 and y0 <= high.y and low.y <= y1:
+                    del self._paths[key]
+                    break
+
+
+# copies a cached path, swapping its final waypoint for the exact goal. paths leave out the start, so the entity
+# walks straight from the start to the first waypoint. the search only vouched for that leg and the one into the goal
+# from its own endpoints, elsewhere in the same cells, so both are re-checked; None if either is blocked
+def _pathcache_stitch(world: World, cached: tuple, start: Vector2, goal: Vector2) -> Optional[List[Vector2]]:
+    path = [waypoint.clone() for waypoint in cached]
+    path[0] = goal.clone()
+    if not has_line_of_sight(world, start, path[-1]):
+        return None
+    if len(path) > 1 and not has_line_of_sight(world, path[1], path[0]):
+        return None
+    return path
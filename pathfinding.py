@@ -1,32 +1,112 @@
 from vector import Vector2
 from heapq import heappush, heappop
 from world.world import World, Zone
-from typing import List
-
-
-# manhatten formula
-def _pathfinding_heuristic(p1: Vector2, p2: Vector2) -> float:
-    return abs(p1.x - p2.x) + abs(p1.y - p2.y)
-
-
-# get all neighbors nearby point
-def _pathfinding_get_neighbors(world: World, point: Vector2, inaccuracy=5) -> List[Vector2]:
-    potential_neighbors = [
-        Vector2(point.x + inaccuracy, point.y),
-        Vector2(point.x + inaccuracy, point.y + inaccuracy),
-        Vector2(point.x,              point.y + inaccuracy),
-        Vector2(point.x - inaccuracy, point.y + inaccuracy),
-        Vector2(point.x - inaccuracy, point.y),
-        Vector2(point.x - inaccuracy, point.y - inaccuracy),
-        Vector2(point.x,              point.y - inaccuracy),
-        Vector2(point.x + inaccuracy, point.y - inaccuracy),
-    ]
-    # neighbors = []
-    # for pn in potential_neighbors:
-    #     if _pathfinding_cast_ray(world, point, pn, True) is pn:
-    #         neighbors.append(pn)
-    # return neighbors
-    return potential_neighbors
+from typing import List, Optional
+from array import array
+from math import sqrt, floor
+from weakref import WeakKeyDictionary
+from time import perf_counter
+from itertools import count
+from raycast import has_line_of_sight
+import numpy
+
+SQRT2 = sqrt(2)
+
+# (dx, dy, cost) for every lattice step, orthogonal first
+_PATHFINDING_MOVES = [
+    (1, 0, 1.0), (0, 1, 1.0), (-1, 0, 1.0), (0, -1, 1.0),
+    (1, 1, SQRT2), (-1, 1, SQRT2), (-1, -1, SQRT2), (1, -1, SQRT2)
+]
+
+# lattices are cached per world and per step; dropping the world drops its lattices
+_pathfinding_grids = WeakKeyDictionary()
+
+
+# walkable lattice sampled from the world's zone raster, one node every `step` units
+class PathGrid:
+    def __init__(self, world: World, step=5):
+        self.step = step
+        self.revision = world.revision
+        self.origin = world.min_pos.clone()
+        cells = world.zone_map[::step, ::step] >= 0
+        self.height, self.width = cells.shape
+        # a flat bytearray indexes much faster from python than the numpy array does
+        self.walkable = bytearray(cells.tobytes())
+        # with every zone edge on a lattice line, each lattice square is all walkable or all blocked in the raster,
+        # so open_squares says exactly what the raster would for segments between nodes
+        self.aligned = all((corner.x - self.origin.x) % step == 0 and (corner.y - self.origin.y) % step == 0
+                           for zone in world.zones for corner in (zone.bottom_left, zone.top_right))
+
+    # one byte per lattice square (the cell between four neighbouring nodes), 1 if all four corners are walkable.
+    # built on first use with a closed border all around, so square (x, y) lives at (y + 1) * (width + 1) + x + 1
+    # and line of sight can step off the lattice without bounds checks
+    def open_squares(self) -> bytearray:
+        squares = getattr(self, "_open_squares", None)
+        if squares is None:
+            nodes = numpy.frombuffer(self.walkable, dtype=numpy.uint8, count=self.width * self.height)
+            nodes = nodes.reshape(self.height, self.width).astype(bool)
+            padded = numpy.zeros((self.height + 1, self.width + 1), dtype=numpy.uint8)
+            padded[1:-1, 1:-1] = nodes[:-1, :-1] & nodes[1:, :-1] & nodes[:-1, 1:] & nodes[1:, 1:]
+            squares = self._open_squares = bytearray(padded.tobytes())
+        return squares
+
+    # a lattice over walkable bytes that already exist elsewhere, such as a shared memory block
+    @classmethod
+    def from_buffer(cls, walkable, width: int, height: int, origin: Vector2, step: int) -> 'PathGrid':
+        grid = cls.__new__(cls)
+        grid.step = step
+        grid.revision = 0
+        grid.origin = origin
+        grid.width = width
+        grid.height = height
+        grid.walkable = walkable
+        grid.aligned = False
+        return grid
+
+    def index(self, x: int, y: int) -> int:
+        return y * self.width + x
+
+    def to_world(self, index: int) -> Vector2:
+        y, x = divmod(index, self.width)
+        return Vector2(self.origin.x + x * self.step, self.origin.y + y * self.step)
+
+    # snaps a point to the closest walkable lattice node, -1 if there is none nearby.
+    # given the world, only nodes the point can see on its raster count
+    def snap(self, point: Vector2, search_radius=2, world=None) -> int:
+        cx = int(floor((point.x - self.origin.x) / self.step + 0.5))
+        cy = int(floor((point.y - self.origin.y) / self.step + 0.5))
+        best, best_distance = -1, None
+        for y in range(cy - search_radius, cy + search_radius + 1):
+            if y < 0 or y >= self.height:
+                continue
+            for x in range(cx - search_radius, cx + search_radius + 1):
+                if x < 0 or x >= self.width or not self.walkable[y * self.width + x]:
+                    continue
+                distance = (x - cx) * (x - cx) + (y - cy) * (y - cy)
+                if best_distance is not None and distance >= best_distance:
+                    continue
+                if world is not None and not has_line_of_sight(world, point, self.to_world(y * self.width + x)):
+                    continue
+                best, best_distance = y * self.width + x, distance
+        return best
+
+
+def get_path_grid(world: World, step=5) -> PathGrid:
+    grids = _pathfinding_grids.get(world)
+    if grids is None:
+        grids = _pathfinding_grids[world] = dict()
+    grid = grids.get(step)
+    if grid is None or grid.revision != world.revision:
+        grid = grids[step] = PathGrid(world, step)
+    return grid
+
+
+# octile distance, in lattice units
+def _pathfinding_heuristic(grid: PathGrid, index: int, goal_x: int, goal_y: int) -> float:
+    y, x = divmod(index, grid.width)
+    dx = abs(x - goal_x)
+    dy = abs(y - goal_y)
+    return dx + dy + (SQRT2 - 2) * min(dx, dy)
 
 
 # check if we're inside of the neighborhood
@@ -41,82 +121,384 @@ def _pathfinding_is_in_neighborhood(zone: Zone, point: Vector2) -> bool:
     return False
 
 
-# cast a ray and check if we collide with a wall or outside of the world
-def _pathfinding_cast_ray(world: World, start: Vector2, goal: Vector2, stop_at_goal=False, inaccuracy=1) -> Vector2:
-    step = (goal - start).normalize()
-    current = start.clone()
+# resumable A* over the lattice. expand() works through the open set for a node budget and picks up
+# where it stopped on the next call; until the goal is found, best is the expanded node closest to it
+class PathSearch:
+    def __init__(self, grid: PathGrid, start: int, goal: int):
+        self.grid = grid
+        self.start = start
+        self.goal = goal
+        node_count = grid.width * grid.height
+
+        # flat per-node state; a node is open iff it has a finite g-score and isn't closed yet
+        self.g_score = array("d", [float("inf")]) * node_count
+        self.parent = array("l", [-1]) * node_count
+        self.closed = bytearray(node_count)
+
+        goal_y, goal_x = divmod(goal, grid.width)
+        self.g_score[start] = 0.0
+        self.best = start
+        self.best_h = _pathfinding_heuristic(grid, start, goal_x, goal_y)
+        self.open_nodes = [(self.best_h, start)]
+        self.expanded = 0
+        self.found = False
+        self.done = False
+
+    # expands up to budget nodes (everything if budget < 0); returns True once the search is over
+    def expand(self, budget=-1) -> bool:
+        if self.done:
+            return True
+        grid = self.grid
+        width, height, walkable = grid.width, grid.height, grid.walkable
+        goal = self.goal
+        goal_y, goal_x = divmod(goal, width)
+        g_score, parent, closed, open_nodes = self.g_score, self.parent, self.closed, self.open_nodes
+        best, best_h = self.best, self.best_h
+        expanded = 0
+
+        while open_nodes and expanded != budget:
+            f_current, current = heappop(open_nodes)
+            # stale heap entry, this node was already expanded through a cheaper path
+            if closed[current]:
+                continue
+            if current == goal:
+                self.found = True
+                best, best_h = current, 0.0
+                break
+            closed[current] = 1
+            expanded += 1
+
+            g_current = g_score[current]
+            if f_current - g_current < best_h:
+                best, best_h = current, f_current - g_current
+            y, x = divmod(current, width)
+            for dx, dy, cost in _PATHFINDING_MOVES:
+                nx, ny = x + dx, y + dy
+                if nx < 0 or ny < 0 or nx >= width or ny >= height:
+                    continue
+                neighbor = ny * width + nx
+                if closed[neighbor] or not walkable[neighbor]:
+                    continue
+                # don't cut corners of zones on diagonals
+                if dx and dy and not (walkable[y * width + nx] and walkable[ny * width + x]):
+                    continue
+
+                g_neighbor = g_current + cost
+                if g_neighbor < g_score[neighbor]:
+                    g_score[neighbor] = g_neighbor
+                    parent[neighbor] = current
+                    ddx = abs(nx - goal_x)
+                    ddy = abs(ny - goal_y)
+                    heappush(open_nodes, (g_neighbor + ddx + ddy + (SQRT2 - 2) * min(ddx, ddy), neighbor))
+
+        self.best, self.best_h = best, best_h
+        self.expanded += expanded
+        self.done = self.found or not open_nodes
+        return self.done
+
+    # path to the goal once found, otherwise to the closest node so far; same ordering as a_star_pathfind
+    def build_path(self, goal_point: Vector2) -> List[Vector2]:
+        if self.found:
+            return _pathfinding_build_path(self.grid, self.parent, self.start, self.goal, goal_point)
+        if self.best == self.start:
+            return []
+        return _pathfinding_build_path(self.grid, self.parent, self.start, self.best, self.grid.to_world(self.best))
+
+
+# A* over the lattice in one go; returns the parent array, or None if the goal can't be reached
+def _pathfinding_search(grid: PathGrid, start: int, goal: int) -> Optional[array]:
+    search = PathSearch(grid, start, goal)
+    search.expand()
+    return search.parent if search.found else None
 
-    while True:
-        current += step
-        # zone = world.get_zone_containing_point(current)
 
-        # check if ray is connected or within game world
-        # if current not in world or not _pathfinding_is_in_neighborhood(zone, current):
-        if current not in world:
-            return current
+# line of sight between two lattice nodes: the segment may only cross open squares, and a segment running
+# along a lattice line needs an open square on at least one side (the Theta* paper's grid check)
+def _pathfinding_line_of_sight(grid: PathGrid, a: int, b: int) -> bool:
+    squares = grid.open_squares()
+    stride = grid.width + 1
+    y0, x0 = divmod(a, grid.width)
+    y1, x1 = divmod(b, grid.width)
+    dx, dy = x1 - x0, y1 - y0
+    sx = 1 if dx >= 0 else -1
+    sy = 1 if dy >= 0 else -1
+    dx, dy = abs(dx), abs(dy)
+    # the square a node is moving into, as an offset from the node's own padded index
+    ahead = (sy - 1) // 2 * stride + (sx - 1) // 2 + stride + 1
+    square = y0 * stride + x0 + ahead
+
+    f = 0
+    if dx >= dy:
+        while x0 != x1:
+            f += dy
+            if f >= dx:
+                if not squares[square]:
+                    return False
+                square += sy * stride
+                f -= dx
+            if f != 0 and not squares[square]:
+                return False
+            if dy == 0 and not squares[square - (sy - 1) // 2 * stride] and \
+                    not squares[square - (sy + 1) // 2 * stride]:
+                return False
+            x0 += sx
+            square += sx
+    else:
+        while y0 != y1:
+            f += dx
+            if f >= dy:
+                if not squares[square]:
+                    return False
+                square += sx
+                f -= dy
+            if f != 0 and not squares[square]:
+                return False
+            if dx == 0 and not squares[square - (sx - 1) // 2] and not squares[square - (sx + 1) // 2]:
+                return False
+            y0 += sy
+            square += sy * stride
+    return True
+
+
+# lazy Theta*: like the lattice A*, but a node optimistically takes its predecessor's parent and only
+# checks line of sight to it when expanded, falling back to its best expanded neighbour if it's blocked.
+# shortcuts are also held against the world's walkable raster wherever the lattice check isn't exact (see
+# _pathfinding_shortcut). costs and the heuristic are euclidean since paths aren't tied to 8 directions
+def _pathfinding_theta_search(world: World, grid: PathGrid, start: int, goal: int) -> Optional[array]:
+    width, height, walkable = grid.width, grid.height, grid.walkable
+    goal_y, goal_x = divmod(goal, width)
+    node_count = width * height
+
+    g_score = array("d", [float("inf")]) * node_count
+    parent = array("l", [-1]) * node_count
+    closed = bytearray(node_count)
+
+    g_score[start] = 0.0
+    parent[start] = start
+    open_nodes = [(0.0, start)]
+
+    while open_nodes:
+        _, current = heappop(open_nodes)
+        if closed[current]:
+            continue
+        y, x = divmod(current, width)
 
-        if stop_at_goal:
-            distance = current.distance(goal)
-            if distance < inaccuracy:
-                return goal
+        source = parent[current]
+        if source != current and not _pathfinding_shortcut(world, grid, source, current):
+            # the optimistic parent is out of sight, go through an expanded neighbour instead
+            best_parent, best_g = -1, float("inf")
+            for dx, dy, cost in _PATHFINDING_MOVES:
+                nx, ny = x + dx, y + dy
+                if nx < 0 or ny < 0 or nx >= width or ny >= height:
+                    continue
+                neighbor = ny * width + nx
+                if not closed[neighbor]:
+                    continue
+                if dx and dy and not (walkable[y * width + nx] and walkable[ny * width + x]):
+                    continue
+                if g_score[neighbor] + cost < best_g:
+                    best_parent, best_g = neighbor, g_score[neighbor] + cost
+            parent[current] = best_parent
+            g_score[current] = best_g
 
+        if current == goal:
+            return parent
+        closed[current] = 1
 
-def a_star_pathfind(world: World, start: Vector2, goal: Vector2) -> List[Vector2]:
+        # candidates for every neighbour are paths straight from our parent
+        source = parent[current]
+        source_y, source_x = divmod(source, width)
+        g_source = g_score[source]
+        for dx, dy, cost in _PATHFINDING_MOVES:
+            nx, ny = x + dx, y + dy
+            if nx < 0 or ny < 0 or nx >= width or ny >= height:
+                continue
+            neighbor = ny * width + nx
+            if closed[neighbor] or not walkable[neighbor]:
+                continue
+            if dx and dy and not (walkable[y * width + nx] and walkable[ny * width + x]):
+                continue
+
+            g_neighbor = g_source + sqrt((nx - source_x) ** 2 + (ny - source_y) ** 2)
+            if g_neighbor < g_score[neighbor]:
+                g_score[neighbor] = g_neighbor
+                parent[neighbor] = source
+                heappush(open_nodes, (g_neighbor + sqrt((nx - goal_x) ** 2 + (ny - goal_y) ** 2), neighbor))
+
+    return None
+
+
+# whether node b may be reached straight from node a. the lattice check is cheap and rules out most blocked
+# shortcuts; in worlds whose zones don't line up with the lattice, the raster has the final say
+def _pathfinding_shortcut(world: World, grid: PathGrid, a: int, b: int) -> bool:
+    if not _pathfinding_line_of_sight(grid, a, b):
+        return False
+    return grid.aligned or has_line_of_sight(world, grid.to_world(a), grid.to_world(b))
+
+
+# walks the parent array back from the goal; the result is ordered goal first and excludes the start
+def _pathfinding_build_path(grid: PathGrid, parent: array, start: int, goal: int,
+                            goal_point: Vector2) -> List[Vector2]:
+    path = [goal_point]
+    current = parent[goal]
+    while current != -1 and current != start:
+        path.append(grid.to_world(current))
+        current = parent[current]
+    return path
+
+
+def a_star_pathfind(world: World, start: Vector2, goal: Vector2, step=5) -> List[Vector2]:
     if start not in world or goal not in world:
         print("err: start or goal not in world")
         return []
 
-    open_nodes = []
-    closed_nodes = set()
-    g_score = {start: 0}
-    parent = {start: start}
+    grid = get_path_grid(world, step)
+    start_index = grid.snap(start)
+    goal_index = grid.snap(goal)
+    if start_index == -1 or goal_index == -1:
+        print("err: start or goal not on walkable lattice")
+        return []
+    if start_index == goal_index:
+        return [goal.clone()]
 
-    heappush(open_nodes, (_pathfinding_heuristic(start, goal), start))
+    parent = _pathfinding_search(grid, start_index, goal_index)
+    if parent is None:
+        print("err: no path found")
+        return []
+    return _pathfinding_build_path(grid, parent, start_index, goal_index, goal.clone())
 
-    while open_nodes:
-        _, current = heappop(open_nodes)
 
-        # we're at the goal!
-        if current.distance(goal) < 10:
-            path = []
-            while current is not start and current in parent:
-                path.append(current)
-                current = parent[current]
-            return path
-
-        # add to closed to prevent recounting
-        closed_nodes.add(current)
-
-        # current_zone = world.get_zone_containing_point(current)
-        for neighbor in _pathfinding_get_neighbors(world, current):
-            if neighbor not in closed_nodes:
-                # if not _pathfinding_is_in_neighborhood(current_zone, neighbor):
-                #     continue
-
-                g_current = g_score[current] + current.distance(neighbor)
-                g_old = g_score.get(neighbor, 0)
-
-                # new path!
-                if g_current < g_old or neighbor not in [_[1] for _ in open_nodes]:
-                    # update vertex and insert to open_nodes
-                    parent[neighbor] = current
-                    g_score[neighbor] = g_current
-                    f_score = g_current + _pathfinding_heuristic(neighbor, goal)
-                    heappush(open_nodes, (f_score, neighbor))
-
-                # if _pathfinding_cast_ray(world, parent[current], neighbor, True) is neighbor:
-                #     g_parent_score = g_score[parent[current]] + parent[current].distance(neighbor)
-                #     if g_parent_score < g_old or neighbor not in [_[1] for _ in open_nodes]:
-                #         parent[neighbor] = parent[current]
-                #         g_score[neighbor] = g_parent_score
-                #         f_score = g_parent_score + _pathfinding_heuristic(neighbor, goal)
-                #         heappush(open_nodes, (f_score, neighbor))
-                # else:
-                #     if g_current < g_old or neighbor not in [_[1] for _ in open_nodes]:
-                #         parent[neighbor] = current
-                #         g_score[neighbor] = g_current
-                #         f_score = g_current + _pathfinding_heuristic(neighbor, goal)
-                #         heappush(open_nodes, (f_score, neighbor))
-
-    print("err: no path found")
-    return []
+# any-angle paths over the same lattice: a few waypoints at the corners that need turning around,
+# with the same contract as a_star_pathfind
+def theta_star_pathfind(world: World, start: Vector2, goal: Vector2, step=5) -> List[Vector2]:
+    if start not in world or goal not in world:
+        print("err: start or goal not in world")
+        return []
+
+    grid = get_path_grid(world, step)
+    start_index = grid.snap(start, world=world)
+    goal_index = grid.snap(goal, world=world)
+    if start_index == -1 or goal_index == -1:
+        print("err: start or goal not on walkable lattice")
+        return []
+    if start_index == goal_index:
+        if has_line_of_sight(world, start, goal):
+            return [goal.clone()]
+        return [goal.clone(), grid.to_world(goal_index)]
+
+    parent = _pathfinding_theta_search(world, grid, start_index, goal_index)
+    if parent is None:
+        print("err: no path found")
+        return []
+    path = _pathfinding_build_path(grid, parent, start_index, goal_index, goal.clone())
+    # the search ran between the nodes the real points snapped to, which they can see. where a real point can't
+    # see the waypoint next to it on the raster, the path goes by its node instead
+    if not has_line_of_sight(world, start, path[-1]):
+        path.append(grid.to_world(start_index))
+    if not has_line_of_sight(world, path[1] if len(path) > 1 else start, goal):
+        path.insert(1, grid.to_world(goal_index))
+    return path
+
+
+# a path wanted by something in the world. the callback gets the finished path on the simulation thread
+class PathRequest:
+    def __init__(self, start: Vector2, goal: Vector2, priority: int, callback, sequence: int):
+        self.start = start.clone()
+        self.goal = goal.clone()
+        self.priority = priority
+        self.callback = callback
+        self.sequence = sequence
+        self.search = None
+        self.result = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def done(self) -> bool:
+        return self.result is not None
+
+    # nodes expanded so far and the best-effort path towards the goal
+    def progress(self):
+        if self.search is None:
+            return 0, self.result or []
+        return self.search.expanded, self.search.build_path(self.goal.clone())
+
+
+# spreads a per-tick node budget over every pending request, most urgent (lowest priority number) first.
+# requests of the same priority split what's left evenly; time_budget (seconds) optionally cuts a tick short.
+# ticked from World.tick_world, so finished paths are handed out on the simulation thread without locking
+class PathScheduler:
+    def __init__(self, world: World, budget=2000, time_budget=None, step=5):
+        self.world = world
+        self.budget = budget
+        self.time_budget = time_budget
+        self.step = step
+        self.pending = list()
+        self._sequence = count()
+
+    def request(self, start: Vector2, goal: Vector2, callback, priority=1) -> PathRequest:
+        request = PathRequest(start, goal, priority, callback, next(self._sequence))
+        if start not in self.world or goal not in self.world:
+            print("err: start or goal not in world")
+            request.result = []
+        else:
+            grid = get_path_grid(self.world, self.step)
+            start_index = grid.snap(start)
+            goal_index = grid.snap(goal)
+            if start_index == -1 or goal_index == -1:
+                print("err: start or goal not on walkable lattice")
+                request.result = []
+            elif start_index == goal_index:
+                request.result = [goal.clone()]
+            else:
+                request.search = PathSearch(grid, start_index, goal_index)
+        # even trivial results wait for the next tick, so callbacks always run in the same place
+        self.pending.append(request)
+        return request
+
+    def tick(self):
+        if not self.pending:
+            return
+        self.pending.sort(key=lambda request: (request.priority, request.sequence))
+        deadline = None if self.time_budget is None else perf_counter() + self.time_budget
+        remaining = self.budget
+        index = 0
+        while index < len(self.pending):
+            priority = self.pending[index].priority
+            tier_end = index
+            while tier_end < len(self.pending) and self.pending[tier_end].priority == priority:
+                tier_end += 1
+            for position in range(index, tier_end):
+                if remaining <= 0 or (deadline is not None and perf_counter() > deadline):
+                    break
+                request = self.pending[position]
+                if request.cancelled or request.search is None:
+                    continue
+                share = max(remaining // (tier_end - position), 1)
+                before = request.search.expanded
+                if request.search.expand(share):
+                    if request.search.found:
+                        request.result = request.search.build_path(request.goal.clone())
+                    else:
+                        print("err: no path found")
+                        request.result = []
+                remaining -= request.search.expanded - before
+            index = tier_end
+
+        still_pending = []
+        for request in self.pending:
+            if request.cancelled:
+                continue
+            if request.result is None:
+                still_pending.append(request)
+            elif request.callback is not None:
+                request.callback(request.result)
+        self.pending = still_pending
+
+
+# the world's scheduler, created and hooked into its tick on first use
+def get_path_scheduler(world: World, budget=2000) -> PathScheduler:
+    if world.path_scheduler is None:
+        world.path_scheduler = PathScheduler(world, budget)
+    return world.path_scheduler
@@ -0,0 +1,147 @@
+from vector import Vector2
+from world.world import World
+from pathfinding import PathGrid, get_path_grid, _pathfinding_search, _pathfinding_build_path
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from array import array
+from threading import Lock
+from typing import List
+import os
+import weakref
+
+# the grid a worker process last attached to: (shared memory name, SharedMemory, PathGrid)
+_pathservice_attached = None
+
+
+# a_star_pathfind on worker processes. the current world's walkable lattice is copied once into a shared
+# memory block that workers map by name, so a request only carries the block's layout and two points.
+# generating a new world, or a streaming world changing its zones, publishes a new block,
+# and workers switch over on their next request. an old block stays around until the requests made against it finish
+class PathService:
+    def __init__(self, workers=None, step=5):
+        self.workers = workers or os.cpu_count() or 1
+        self.step = step
+        # workers must share our resource tracker, or theirs would report the blocks they attach to as leaked
+        resource_tracker.ensure_running()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._memory = None
+        # SharedMemory name -> [block, requests in flight]; a block is unlinked once it's been replaced and idle
+        self._blocks = dict()
+        self._layout = None
+        self._world = None
+        self._revision = -1
+        # find_path is called from the game's thread pool
+        self._lock = Lock()
+
+    # copies the world's lattice into a fresh shared memory block, unless it's already the published one.
+    # worlds loaded from a world file go the same way: the lattice is derived from the mapped raster once, here,
+    # and every worker maps that one block rather than sampling the file into a copy of its own
+    def publish(self, world: World) -> tuple:
+        with self._lock:
+            return self._pathservice_publish(world)
+
+    # future of the path as a flat array('d') of x, y pairs, ordered goal first and without the start
+    def submit(self, world: World, start: Vector2, goal: Vector2) -> Future:
+        if start not in world or goal not in world:
+            print("err: start or goal not in world")
+            future = Future()
+            future.set_result(array("d"))
+            return future
+        with self._lock:
+            layout = self._pathservice_publish(world)
+            name = layout[0]
+            future = self._executor.submit(_pathservice_find, layout, start.x, start.y, goal.x, goal.y)
+            self._blocks[name][1] += 1
+        # outside the lock, an already finished future runs the callback right away
+        future.add_done_callback(lambda _: self._pathservice_finished(name))
+        return future
+
+    # blocking, with the same result as a_star_pathfind; fits anywhere a pathfind function is expected
+    def find_path(self, world: World, start: Vector2, goal: Vector2) -> List[Vector2]:
+        return unpack_path(self.submit(world, start, goal).result())
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            self._memory = None
+            for name in list(self._blocks):
+                self._pathservice_unlink(name)
+            self._world = None
+
+    def _pathservice_publish(self, world: World) -> tuple:
+        if self._world is not None and self._world() is world and self._revision == world.revision:
+            return self._layout
+        grid = get_path_grid(world, self.step)
+        self._pathservice_retire()
+        memory = shared_memory.SharedMemory(create=True, size=max(len(grid.walkable), 1))
+        memory.buf[:len(grid.walkable)] = grid.walkable
+        self._memory = memory
+        self._blocks[memory.name] = [memory, 0]
+        self._layout = (memory.name, grid.width, grid.height, grid.origin.x, grid.origin.y, grid.step)
+        self._world = weakref.ref(world)
+        self._revision = world.revision
+        return self._layout
+
+    # the current block is being replaced; it goes now if nothing is queued against it, else with its last request
+    def _pathservice_retire(self):
+        if self._memory is not None:
+            name = self._memory.name
+            self._memory = None
+            if self._blocks[name][1] == 0:
+                self._pathservice_unlink(name)
+
+    # runs on the executor's thread once a request is done, failed or cancelled
+    def _pathservice_finished(self, name: str):
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None:
+                return
+            block[1] -= 1
+            if block[1] == 0 and block[0] is not self._memory:
+                self._pathservice_unlink(name)
+
+    def _pathservice_unlink(self, name: str):
+        # workers still holding the block keep their mapping until they attach to the next one
+        memory = self._blocks.pop(name)[0]
+        memory.close()
+        memory.unlink()
+
+
+def unpack_path(coordinates: array) -> List[Vector2]:
+    return [Vector2(coordinates[i], coordinates[i + 1]) for i in range(0, len(coordinates), 2)]
+
+
+# runs in a worker process
+def _pathservice_grid(layout: tuple) -> PathGrid:
+    global _pathservice_attached
+    name, width, height, origin_x, origin_y, step = layout
+    if _pathservice_attached is None or _pathservice_attached[0] != name:
+        if _pathservice_attached is not None:
+            _pathservice_attached[2].walkable.release()
+            _pathservice_attached[1].close()
+        memory = shared_memory.SharedMemory(name=name)
+        walkable = memory.buf[:width * height]
+        grid = PathGrid.from_buffer(walkable, width, height, Vector2(origin_x, origin_y), step)
+        _pathservice_attached = (name, memory, grid)
+    return _pathservice_attached[2]
+
+
+# runs in a worker process
+def _pathservice_find(layout: tuple, start_x: float, start_y: float, goal_x: float, goal_y: float) -> array:
+    grid = _pathservice_grid(layout)
+    goal = Vector2(goal_x, goal_y)
+    start_index = grid.snap(Vector2(start_x, start_y))
+    goal_index = grid.snap(goal)
+    if start_index == -1 or goal_index == -1:
+        return array("d")
+    if start_index == goal_index:
+        return array("d", (goal_x, goal_y))
+
+    parent = _pathfinding_search(grid, start_index, goal_index)
+    if parent is None:
+        return array("d")
+    coordinates = array("d")
+    for waypoint in _pathfinding_build_path(grid, parent, start_index, goal_index, goal):
+        coordinates.append(waypoint.x)
+        coordinates.append(waypoint.y)
+    return coordinates
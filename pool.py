@@ -0,0 +1,43 @@
+# bounded free-list of short-lived entities of one class.
+# acquire() re-initializes a released entity through its reset() instead of building a new one,
+# and the world hands dead entities back with release() when it sweeps them
+class EntityPool:
+    def __init__(self, entity_class, capacity=512):
+        self.entity_class = entity_class
+        self.capacity = capacity
+        self.free = list()
+        self.created = 0
+        self.reused = 0
+        self.released = 0
+        self.dropped = 0
+
+    # takes the same arguments as the entity's constructor
+    def acquire(self, *args):
+        if self.free:
+            entity = self.free.pop()
+            entity.reset(*args)
+            self.reused += 1
+        else:
+            entity = self.entity_class(*args)
+            self.created += 1
+        entity.pool = self
+        return entity
+
+    def release(self, entity):
+        # clearing pool also guards against the same entity being released twice
+        entity.pool = None
+        entity.recycle()
+        if len(self.free) >= self.capacity:
+            self.dropped += 1
+            return
+        self.free.append(entity)
+        self.released += 1
+
+    def stats(self) -> dict:
+        return {
+            "free": len(self.free),
+            "created": self.created,
+            "reused": self.reused,
+            "released": self.released,
+            "dropped": self.dropped
+        }
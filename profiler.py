@@ -0,0 +1,84 @@
+from collections import deque
+from time import perf_counter
+from typing import List, Tuple
+
+
+# context manager handed out while profiling is off, so `with profiler.phase(...)` costs next to nothing
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, perf_counter() - self.start)
+        return False
+
+
+# rolling timing histograms per named phase, plus plain gauges (entity counts, queue depths, ...).
+# hot per-entity code accumulates into a tick total with accumulate() and flush() turns those into one sample
+class Profiler:
+    def __init__(self, window=240):
+        self.enabled = False
+        self.window = window
+        self.samples = dict()
+        self.gauges = dict()
+        self._pending = dict()
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def record(self, name: str, seconds: float):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def accumulate(self, name: str, seconds: float):
+        self._pending[name] = self._pending.get(name, 0.0) + seconds
+
+    def flush(self):
+        pending, self._pending = self._pending, dict()
+        for name, seconds in pending.items():
+            self.record(name, seconds)
+
+    def gauge(self, name: str, value):
+        self.gauges[name] = value
+
+    def reset(self):
+        self.samples.clear()
+        self.gauges.clear()
+        self._pending.clear()
+
+    # (name, p50, p95, max) in seconds for every phase, sorted by name
+    def report(self) -> List[Tuple[str, float, float, float]]:
+        rows = []
+        for name in sorted(self.samples):
+            values = sorted(self.samples[name])
+            if not values:
+                continue
+            last = len(values) - 1
+            rows.append((name, values[last // 2], values[(last * 95) // 100], values[last]))
+        return rows
+
+
+# the process-wide profiler used by the world, entities and the game loop
+profiler = Profiler()
@@ -0,0 +1,252 @@
+from vector import Vector2, Vector2Array
+from world.world import World
+from math import floor, ceil, sqrt
+from typing import Optional
+from weakref import WeakKeyDictionary
+import numpy
+
+INFINITY = float("inf")
+
+# walkability of every raster cell, cached per world:
+# (revision, flat bytearray for single rays, bool array over the same bytes for batches, raster origin)
+_raycast_grids = WeakKeyDictionary()
+
+
+# where a ray stopped: the point and distance along the ray, and the blocked raster cell it ran into
+class RayHit:
+    __slots__ = ("point", "distance", "cell")
+
+    def __init__(self, point: Vector2, distance: float, cell: tuple):
+        self.point = point
+        self.distance = distance
+        self.cell = cell
+
+    def __repr__(self):
+        return "RayHit(%s, %.2f, %s)" % (repr(self.point), self.distance, self.cell)
+
+
+def _raycast_grid(world: World):
+    grid = _raycast_grids.get(world)
+    if grid is None or grid[0] != world.revision:
+        zone_map = world.zone_map
+        areas = world.changes_since(grid[0]) if grid is not None else None
+        if areas is not None and grid[2].shape == zone_map.shape and grid[3] == world.min_pos:
+            # same raster frame, so only the changed areas are re-read, in place
+            walkable, cells = grid[1:3]
+            for low, high in areas:
+                x0 = max(int(floor(low.x - world.min_pos.x)), 0)
+                y0 = max(int(floor(low.y - world.min_pos.y)), 0)
+                x1 = max(int(ceil(high.x - world.min_pos.x)), 0)
+                y1 = max(int(ceil(high.y - world.min_pos.y)), 0)
+                numpy.greater_equal(zone_map[y0:y1, x0:x1], 0, out=cells[y0:y1, x0:x1])
+        else:
+            walkable = bytearray(zone_map.size)
+            cells = numpy.frombuffer(walkable, dtype=bool).reshape(zone_map.shape)
+            numpy.greater_equal(zone_map, 0, out=cells)
+        grid = _raycast_grids[world] = (world.revision, walkable, cells, world.min_pos.clone())
+    return grid[1:3]
+
+
+# raster cell of a point, with points on the world's max edge kept in the last cell like World does
+def _raycast_cell(x: float, y: float, width: int, height: int):
+    cell_x = int(floor(x))
+    cell_y = int(floor(y))
+    if cell_x == width and x == width:
+        cell_x -= 1
+    if cell_y == height and y == height:
+        cell_y -= 1
+    return cell_x, cell_y
+
+
+# walks the world's 1 unit raster cell by cell along the ray (Amanatides & Woo) until it enters a cell outside
+# every zone. passing exactly through a cell corner checks both cells beside it, so rays can't slip
+# between two diagonal walls. returns None if nothing blocks the ray within max_distance
+def cast_ray(world: World, origin: Vector2, direction: Vector2, max_distance=INFINITY) -> Optional[RayHit]:
+    walkable, cells = _raycast_grid(world)
+    height, width = cells.shape
+    length = sqrt(direction.x * direction.x + direction.y * direction.y)
+    dx = direction.x / length if length else 0.0
+    dy = direction.y / length if length else 0.0
+    px = origin.x - world.min_pos.x
+    py = origin.y - world.min_pos.y
+    x, y = _raycast_cell(px, py, width, height)
+
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    delta_x = abs(1 / dx) if dx else INFINITY
+    delta_y = abs(1 / dy) if dy else INFINITY
+    # distance along the ray to the first vertical and horizontal cell border. the k-th border after that is at
+    # first + k * delta rather than a running sum, the same floats cast_rays comes up with
+    first_x = next_x = ((x + 1 - px) if dx > 0 else (px - x)) * delta_x if dx else INFINITY
+    first_y = next_y = ((y + 1 - py) if dy > 0 else (py - y)) * delta_y if dy else INFINITY
+    crossed_x = crossed_y = 0
+
+    distance = 0.0
+    while True:
+        if x < 0 or y < 0 or x >= width or y >= height or not walkable[y * width + x]:
+            return RayHit(Vector2(origin.x + dx * distance, origin.y + dy * distance), distance, (x, y))
+        if next_x == INFINITY and next_y == INFINITY:
+            return None
+        if next_x == next_y:
+            distance = next_x
+            if distance > max_distance:
+                return None
+            # through the corner; either neighbour being blocked stops the ray
+            for side_x, side_y in ((x + step_x, y), (x, y + step_y)):
+                if side_x < 0 or side_y < 0 or side_x >= width or side_y >= height or \
+                        not walkable[side_y * width + side_x]:
+                    return RayHit(Vector2(origin.x + dx * distance, origin.y + dy * distance), distance,
+                                  (side_x, side_y))
+            x += step_x
+            y += step_y
+            crossed_x += 1
+            crossed_y += 1
+            next_x = first_x + crossed_x * delta_x
+            next_y = first_y + crossed_y * delta_y
+        elif next_x < next_y:
+            distance = next_x
+            if distance > max_distance:
+                return None
+            x += step_x
+            crossed_x += 1
+            next_x = first_x + crossed_x * delta_x
+        else:
+            distance = next_y
+            if distance > max_distance:
+                return None
+            y += step_y
+            crossed_y += 1
+            next_y = first_y + crossed_y * delta_y
+
+
+# how many of a ray's crossings along one axis, at first + k * delta, come at or before distance
+# (strictly before it with inclusive unset), to the float exactly like cast_ray's comparisons
+def _raycast_crossed(first: numpy.ndarray, delta: numpy.ndarray, distance: numpy.ndarray, inclusive=True):
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        estimate = (distance - first) / delta
+        crossed = numpy.floor(estimate) + 1 if inclusive else numpy.ceil(estimate)
+        crossed = numpy.clip(numpy.nan_to_num(crossed, nan=0.0, posinf=0.0, neginf=0.0), 0, None)
+        # the division can land one off either way, the products decide
+        before = first + (crossed - 1) * delta
+        crossed -= (crossed > 0) & ((before > distance) if inclusive else (before >= distance))
+        after = first + crossed * delta
+        crossed += (after <= distance) if inclusive else (after < distance)
+    return crossed.astype(numpy.int64)
+
+
+# the same walk for many rays at once. rays go forward together a window of span units at a time: each window lists
+# the border crossings every ray makes within it, works out the cells they lead into and looks them all up in one go,
+# and only rays that haven't hit anything carry on. max_distance can be one value or one per ray.
+# returns hit distances (inf where nothing was hit within max_distance) and the blocked cells (-1 where not hit)
+def cast_rays(world: World, origins: Vector2Array, directions: Vector2Array, max_distance=INFINITY, span=64.0):
+    walkable, cells = _raycast_grid(world)
+    height, width = cells.shape
+    count = len(origins)
+    limits = numpy.broadcast_to(numpy.asarray(max_distance, dtype=numpy.float64), (count,))
+
+    directions = directions.normalize().data
+    dx, dy = directions[:, 0], directions[:, 1]
+    px = origins.data[:, 0] - world.min_pos.x
+    py = origins.data[:, 1] - world.min_pos.y
+    x = numpy.floor(px).astype(numpy.int64)
+    y = numpy.floor(py).astype(numpy.int64)
+    x[(x == width) & (px == width)] -= 1
+    y[(y == height) & (py == height)] -= 1
+
+    step_x = numpy.where(dx > 0, 1, -1)
+    step_y = numpy.where(dy > 0, 1, -1)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        delta_x = numpy.where(dx != 0, numpy.abs(1 / dx), INFINITY)
+        delta_y = numpy.where(dy != 0, numpy.abs(1 / dy), INFINITY)
+        first_x = numpy.where(dx != 0, numpy.where(dx > 0, x + 1 - px, px - x) * delta_x, INFINITY)
+        first_y = numpy.where(dy != 0, numpy.where(dy > 0, y + 1 - py, py - y) * delta_y, INFINITY)
+
+    distances = numpy.full(count, INFINITY)
+    hit_cells = numpy.full((count, 2), -1, dtype=numpy.int64)
+
+    def blocked(cell_x, cell_y):
+        inside = (cell_x >= 0) & (cell_y >= 0) & (cell_x < width) & (cell_y < height)
+        result = ~inside
+        result[inside] = ~cells[cell_y[inside], cell_x[inside]]
+        return result
+
+    # every ray starts by checking its own cell
+    stopped = blocked(x, y)
+    distances[stopped] = 0.0
+    hit_cells[stopped, 0] = x[stopped]
+    hit_cells[stopped, 1] = y[stopped]
+    # rays with no direction never leave their cell
+    active = numpy.flatnonzero(~stopped & ((first_x != INFINITY) | (first_y != INFINITY)))
+    covered = numpy.zeros(count)
+    crossed_x = numpy.zeros(count, dtype=numpy.int64)
+    crossed_y = numpy.zeros(count, dtype=numpy.int64)
+
+    while len(active):
+        end = numpy.minimum(covered[active] + span, limits[active])
+        end_x = _raycast_crossed(first_x[active], delta_x[active], end)
+        end_y = _raycast_crossed(first_y[active], delta_y[active], end)
+
+        checks = []
+        for axis, done, total in ((0, crossed_x[active], end_x), (1, crossed_y[active], end_y)):
+            # this window's crossings of one kind: which active ray, and the index of the crossing along the ray
+            new = total - done
+            local = numpy.repeat(numpy.arange(len(active)), new)
+            index = numpy.arange(len(local)) - numpy.repeat(numpy.cumsum(new) - new, new) + done[local]
+            ray = active[local]
+            if axis == 0:
+                at = first_x[ray] + index * delta_x[ray]
+                # vertical crossings go first at a corner, so only the horizontal ones strictly before count
+                others = _raycast_crossed(first_y[ray], delta_y[ray], at, inclusive=False)
+                cell_x = x[ray] + step_x[ray] * (index + 1)
+                cell_y = y[ray] + step_y[ray] * others
+                checks.append((local, at, numpy.ones(len(local), dtype=numpy.int64), cell_x, cell_y))
+            else:
+                at = first_y[ray] + index * delta_y[ray]
+                others = _raycast_crossed(first_x[ray], delta_x[ray], at)
+                cell_x = x[ray] + step_x[ray] * others
+                cell_y = y[ray] + step_y[ray] * (index + 1)
+                checks.append((local, at, numpy.full(len(local), 3), cell_x, cell_y))
+                # through a corner the vertical crossing led into one cell beside it; this is the other one
+                with numpy.errstate(invalid="ignore"):
+                    corner = (others > 0) & (first_x[ray] + (others - 1) * delta_x[ray] == at)
+                checks.append((local[corner], at[corner], numpy.full(numpy.count_nonzero(corner), 2),
+                               cell_x[corner] - step_x[ray[corner]], cell_y[corner]))
+
+        local, at, order, cell_x, cell_y = (numpy.concatenate(parts) for parts in zip(*checks))
+        hit = blocked(cell_x, cell_y)
+        local, at, order, cell_x, cell_y = local[hit], at[hit], order[hit], cell_x[hit], cell_y[hit]
+        # each ray's first blocked check: the nearest, and at a corner in cast_ray's order
+        nearest = numpy.full(len(active), INFINITY)
+        numpy.minimum.at(nearest, local, at)
+        first = at == nearest[local]
+        earliest = numpy.full(len(active), 4)
+        numpy.minimum.at(earliest, local[first], order[first])
+        first &= order == earliest[local]
+        rays = active[local[first]]
+        distances[rays] = at[first]
+        hit_cells[rays, 0] = cell_x[first]
+        hit_cells[rays, 1] = cell_y[first]
+
+        crossed_x[active] = end_x
+        crossed_y[active] = end_y
+        covered[active] = end
+        active = active[(nearest == INFINITY) & (end < limits[active])]
+
+    return distances, hit_cells
+
+
+# true if the straight segment from a to b stays inside the world
+def has_line_of_sight(world: World, a: Vector2, b: Vector2) -> bool:
+    dx = b.x - a.x
+    dy = b.y - a.y
+    return cast_ray(world, a, Vector2(dx, dy), sqrt(dx * dx + dy * dy)) is None
+
+
+# has_line_of_sight for many segments at once, all cast together through cast_rays; true where starts[i] sees ends[i]
+def lines_of_sight(world: World, starts: Vector2Array, ends: Vector2Array) -> numpy.ndarray:
+    offsets = ends - starts
+    lengths = offsets.length()
+    if not len(lengths):
+        return numpy.zeros(0, dtype=bool)
+    distances, _ = cast_rays(world, starts, offsets, lengths)
+    return distances == INFINITY
@@ -1,10 +1,16 @@
-from world.worldgen import WorldGenerator
+from world.worldgen import WorldGenerator, WorldGenerationError
 from vector import Vector2
 from ui.camera import Camera
-from pathfinding import a_star_pathfind
+from pathfinding import a_star_pathfind, theta_star_pathfind, get_path_scheduler
+from navmesh import navmesh_pathfind
+from pathcache import PathCache
+from pathservice import PathService
+from profiler import profiler
+from ui.overlay import PerformanceOverlay
+from ui.hover import HoverTracker
 from skill.support import *
 from pyglet.gl import *
-from entity import EnemyEntity, Player
+from entity import EnemyEntity, Player, arrow_pool
 import pyglet
 from ui import rendering
 from skill.skill import BowAttack
@@ -16,6 +22,8 @@ from pyglet.window import FPSDisplay
 from pyglet.text import Label
 
 
+_log = logging.getLogger(__name__)
+
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
 
@@ -33,64 +41,78 @@ if __name__ == "__main__":
     # generate default world and dummy enemy
     world = generator.generate()
     camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT, 2)
-    world.entities.append(EnemyEntity(world, Vector2(25, 25)))
+    world.add_entity(EnemyEntity(world, Vector2(25, 25)))
     # enable player and give it the default Arrow Attack
     player = Player(world)
     player.skill = BowAttack()
     # add player, initialize labels
-    world.entities.append(player)
+    world.add_entity(player)
     fps_display = FPSDisplay(window)
     fps_display.label.x += 200
+    # per-phase timings, toggled with F3
+    performance_overlay = PerformanceOverlay(profiler, fps_display.label.x, fps_display.label.y + 40)
+    pyglet.clock.schedule_interval(performance_overlay.refresh, 0.25)
+    # highlighted zone under the cursor
+    hover = HoverTracker()
+    # pathfinding requests still waiting on the pool
+    pending_paths = set()
     support_display = Label("No Active Supports", font_size=12,
                             x=window.width//2, y=12, anchor_x="center", anchor_y="center")
     score_display = Label("Score: ", font_size=12, x=window.width//2, y=24, anchor_x="center", anchor_y="center")
+    # pathfinding modes the player can cycle through with N, each with its own path cache
+    # grid searches on worker processes, so they run on other cores instead of fighting the game loop for the GIL
+    path_service = PathService()
+    path_service.publish(world)
+    path_modes = [("Navmesh", PathCache(navmesh_pathfind)), ("Grid A*", PathCache(a_star_pathfind)),
+                  ("Any-angle Theta*", PathCache(theta_star_pathfind)),
+                  ("Grid A* (processes)", PathCache(path_service.find_path)),
+                  # no cache: searched a slice at a time inside the world tick instead of on the pool
+                  ("Grid A* (sliced)", None)]
+    path_mode = 0
+    path_mode_display = Label("Pathfinding: " + path_modes[path_mode][0], font_size=12,
+                              x=window.width//2, y=36, anchor_x="center", anchor_y="center")
 
     @window.event
     def on_draw():
         window.clear()
 
-        # translate to isometric view
+        # translate to isometric view; the camera projects, so the world is drawn in world coordinates
         camera.initialize_ortho()
         camera.translate_with_position()
 
         # draw world and entities
-        rendering.draw_world(world)
-        rendering.draw_entities(world.entities)
+        with profiler.phase("draw.world"):
+            rendering.draw_world(world)
+        with profiler.phase("draw.entities"):
+            rendering.draw_entities(world.entities, world.physics)
 
         # reset ortho and draw UI now
         camera.reset_identity()
-        rendering.draw_ui(SCREEN_WIDTH, SCREEN_HEIGHT, world, player)
+        with profiler.phase("draw.ui"):
+            rendering.draw_ui(SCREEN_WIDTH, SCREEN_HEIGHT, world, player)
 
-        # draw labels on screen
-        fps_display.draw()
-        support_display.draw()
-        score_display.draw()
+            # draw labels on screen
+            fps_display.draw()
+            support_display.draw()
+            score_display.draw()
+            path_mode_display.draw()
+            performance_overlay.draw()
 
 
     @window.event
     def on_mouse_motion(x, y, dx, dy):
-        # find zone where cursor is in
-        zone = world.get_zone_containing_point(screen_to_game(x, y).to_2d())
-        if zone is None:
-            return
-        for other_zone in world.zones:
-            # brighten up zone and make it known to the user that this is the selected
-            if other_zone is zone:
-                color = (128, 128, 128)
-            # elif other_zone in zone.get_neighbors():
-            #     color = (64, 64, 64)
-            else:
-                color = (16, 16, 16)
-            other_zone.color = color
+        # find zone where cursor is in and highlight it
+        zone = world.get_zone_containing_point(camera.screen_point_to_world(x, y))
+        hover.update(world, zone)
 
     @window.event
     def on_mouse_press(x, y, button, modifiers):
         # find where the user clicked in game world
-        game_coord = screen_to_game(x, y).to_2d()
+        game_coord = camera.screen_point_to_world(x, y)
         if button == pyglet.window.mouse.RIGHT:
             # check if player is alive
             if player.health > 0:
-                # point = screen_to_game(x, y).to_2d()
+                # point = camera.screen_point_to_world(x, y)
                 # paths[:] = []
                 # for entity in world.entities:
                 #     if entity is not player:
@@ -104,8 +126,17 @@ if __name__ == "__main__":
                 if player.planning is not None:
                     player.planning.cancel()
                     player.planning = None
-                player.planning = pool.submit(a_star_pathfind, world, player.position, game_coord)\
-                    .add_done_callback(lambda future: player.follow_path(future.result()))
+                if path_modes[path_mode][1] is None:
+                    # the player's request goes ahead of everything else in the tick's search budget
+                    player.planning = get_path_scheduler(world).request(player.position, game_coord,
+                                                                        player.follow_path, priority=0)
+                    return
+                planning = pool.submit(timed_pathfind, path_modes[path_mode][1].find_path,
+                                       world, player.position, game_coord)
+                pending_paths.add(planning)
+                profiler.gauge("pathfinding.queue", len(pending_paths))
+                planning.add_done_callback(on_path_found)
+                player.planning = planning
 
     @window.event
     def on_mouse_drag(x, y, dx, dy, button, modifiers):
@@ -119,7 +150,13 @@ if __name__ == "__main__":
             if player.god_mode:
                 return
             global world
-            world = WorldGenerator(15, Vector2(100, 100), Vector2(300, 300), 50).generate()
+            try:
+                new_world = WorldGenerator(15, Vector2(100, 100), Vector2(300, 300), 50).generate()
+            except WorldGenerationError as error:
+                # keep playing on the current world rather than crashing the window
+                _log.warning("World regeneration failed, keeping the current world: %s", error)
+                return
+            world = new_world
             # reset camera and player stats
             camera.position = Vector2(0, 0)
             player.velocity = Vector2(0, 0)
@@ -137,10 +174,22 @@ if __name__ == "__main__":
             player.score = 0
             # give player godmode, but disable after 3 seconds
             pyglet.clock.schedule_once(disable_god_mode, 3.0)
-            world.entities.append(player)
+            world.add_entity(player)
+            path_service.publish(world)
             # spawn enemies now and update support display
             spawn_enemies()
             update_support_display()
+        elif symbol == pyglet.window.key.P:
+            # export the current world layout without stalling the game loop
+            world.dump_world(background=True)
+        elif symbol == pyglet.window.key.F3:
+            # show or hide the performance overlay
+            performance_overlay.toggle()
+        elif symbol == pyglet.window.key.N:
+            # cycle through pathfinding modes
+            global path_mode
+            path_mode = (path_mode + 1) % len(path_modes)
+            path_mode_display.text = "Pathfinding: " + path_modes[path_mode][0]
         elif symbol == pyglet.window.key._1:
             # add multi proj
             player.toggle_support(MultipleProjectilesSupport())
@@ -156,6 +205,17 @@ if __name__ == "__main__":
         # elif symbol == pyglet.window.key._3:
         #     player.toggle_support(ChainSupport())
 
+    def timed_pathfind(pathfind, pathfind_world, start, goal):
+        # runs on the pool; timed so the overlay can show how long searches take
+        with profiler.phase("pathfinding.search"):
+            return pathfind(pathfind_world, start, goal)
+
+    def on_path_found(future):
+        pending_paths.discard(future)
+        profiler.gauge("pathfinding.queue", len(pending_paths))
+        if not future.cancelled():
+            player.follow_path(future.result())
+
     def disable_god_mode(dt):
         # callback for 3 seconds after to disable godmode
         player.god_mode = False
@@ -179,25 +239,23 @@ if __name__ == "__main__":
                 random.randint(random_zone.bottom_left.x, random_zone.top_right.x),
                 random.randint(random_zone.bottom_left.y, random_zone.top_right.y),
             )
-            # create enemy and add their goal (shoot at player)
+            # create enemy and add their goals (close in on the player and shoot at them)
             other_entity = EnemyEntity(world, spawning_location)
+            other_entity.add_goal(ChaseGoal(other_entity, player))
             other_entity.add_goal(ShootAtPlayerGoal(other_entity, player))
             # spawn in world
-            world.entities.append(other_entity)
-
-    def screen_to_game(x, y):
-        # general formula to convert screen coords to in-game isometric coords
-        return Vector2((x - HALF_SCREEN_WIDTH + camera.position.x) / camera.zoom,
-                       (y - HALF_SCREEN_HEIGHT + camera.position.y) / camera.zoom)
+            world.add_entity(other_entity)
 
     def tick(dt):
         # camera follows player
-        camera_pos = player.position.to_iso()
-        camera.position.x = camera_pos.x * camera.zoom
-        camera.position.y = camera_pos.y * camera.zoom
+        camera.follow(player.position)
         # tick world and show score
-        world.tick_world(dt)
+        with profiler.phase("tick.total"):
+            world.tick_world(dt)
+        if profiler.enabled:
+            profiler.gauge("arrow_pool", arrow_pool.stats())
         score_display.text = "Score: " + str(player.score)
 
     pyglet.clock.schedule_interval(tick, 1 / 60)
     pyglet.app.run()
+    path_service.close()
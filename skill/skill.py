@@ -1,5 +1,5 @@
 from world.world import World
-from entity import Entity, ArrowEntity
+from entity import Entity, arrow_pool
 from enum import Enum
 from typing import List
 from abc import abstractmethod, ABC
@@ -35,10 +35,10 @@ class BowAttack(Skill):
             slightly_random_direction = direction + Vector2(randint(-context["spread"], context["spread"]) / 20,
                                                             randint(-context["spread"], context["spread"]) / 20)
             # world, position, maximum_speed, damage, source
-            arrow = ArrowEntity(world, source.position, context["speed"], slightly_random_direction,
-                                400 * context["damage_modifier"], source, context["pierce_count"])
+            arrow = arrow_pool.acquire(world, source.position, context["speed"], slightly_random_direction,
+                                       400 * context["damage_modifier"], source, context["pierce_count"])
             # spawn "entity" and subtract from to_spawn
-            world.entities.append(arrow)
+            world.add_entity(arrow)
             to_spawn -= 1
 
     def generate_context(self, source: Entity):
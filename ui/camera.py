@@ -1,6 +1,12 @@
-from vector import Vector2
+from vector import Vector2, Vector2Array
 from pyglet.gl import *
 
+# world -> isometric view, (x, y) -> (x - y, (x + y) / 2), as a column-major 4x4 for glMultMatrixf
+_CAMERA_ISO_MATRIX = (GLfloat * 16)(1, 0.5, 0, 0,
+                                    -1, 0.5, 0, 0,
+                                    0, 0, 1, 0,
+                                    0, 0, 0, 1)
+
 
 class Camera:
     def __init__(self, screen_width: int, screen_height: int, zoom: int):
@@ -19,14 +25,37 @@ class Camera:
         else:
             glOrtho(0, self.screen_width, 0, self.screen_height, -1, 1)
 
-    # fake "movement" by simply shifting camera
+    # fake "movement" by simply shifting camera, then project into isometric view,
+    # so everything drawn after this is submitted in plain world coordinates
     def translate_with_position(self):
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
         glTranslatef(-self.position.x, -self.position.y, 0)
         glScalef(self.zoom, self.zoom, 0)
+        glMultMatrixf(_CAMERA_ISO_MATRIX)
 
     # resets identity and restores old 0,0-bottom-left view
     def reset_identity(self):
         glLoadIdentity()
         self.initialize_ortho(False)
+
+    # centers the view on a point in world coordinates
+    def follow(self, point: Vector2):
+        iso = point.to_iso()
+        self.position.x = iso.x * self.zoom
+        self.position.y = iso.y * self.zoom
+
+    # world coordinates to window pixels (0,0 bottom left), same transform as the modelview above
+    def world_to_screen(self, points: Vector2Array) -> Vector2Array:
+        screen = points.to_iso() * self.zoom
+        screen -= Vector2(self.position.x - self.screen_width / 2, self.position.y - self.screen_height / 2)
+        return screen
+
+    # window pixels back to world coordinates, for picking
+    def screen_to_world(self, points: Vector2Array) -> Vector2Array:
+        iso = points + Vector2(self.position.x - self.screen_width / 2, self.position.y - self.screen_height / 2)
+        iso /= self.zoom
+        return iso.to_2d()
+
+    def screen_point_to_world(self, x: float, y: float) -> Vector2:
+        return self.screen_to_world(Vector2Array.from_vectors([Vector2(x, y)]))[0]
@@ -0,0 +1,32 @@
+from world.world import World, Zone
+from ui import rendering
+
+HIGHLIGHT_COLOR = (128, 128, 128)
+DIM_COLOR = (16, 16, 16)
+
+
+# remembers which zone is highlighted under the cursor. moving within the same zone does nothing,
+# moving to another one recolors just the old and the new zone; only the first hover of a world dims them all
+class HoverTracker:
+    def __init__(self):
+        self.world = None
+        self.hovered = None
+
+    def update(self, world: World, zone: Zone):
+        if world is not self.world:
+            self.world = world
+            self.hovered = None
+        if zone is None or zone is self.hovered:
+            return
+
+        if self.hovered is None:
+            changed = world.zones
+            for other_zone in changed:
+                other_zone.color = DIM_COLOR
+        else:
+            changed = [self.hovered, zone]
+            self.hovered.color = DIM_COLOR
+        # brighten up zone and make it known to the user that this is the selected
+        zone.color = HIGHLIGHT_COLOR
+        self.hovered = zone
+        rendering.mark_zones_dirty(world, changed)
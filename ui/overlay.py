@@ -0,0 +1,36 @@
+from profiler import Profiler
+from pyglet.text import Label
+
+
+# text overlay with the profiler's rolling p50/p95/max per phase and its gauges.
+# showing it turns profiling on, hiding it turns profiling off again and forgets the samples
+class PerformanceOverlay:
+    def __init__(self, profiler: Profiler, x: int, y: int):
+        self.profiler = profiler
+        self.visible = False
+        self.label = Label("", font_name="Courier New", font_size=9, x=x, y=y,
+                           anchor_x="left", anchor_y="bottom", multiline=True, width=520)
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.profiler.enabled = self.visible
+        if not self.visible:
+            self.profiler.reset()
+        self.refresh()
+
+    # rebuilding the text is the expensive part, so this runs on a slow clock rather than every frame
+    def refresh(self, dt=None):
+        if not self.visible:
+            return
+        lines = ["%-34s %8s %8s %8s" % ("phase (ms)", "p50", "p95", "max")]
+        for name, p50, p95, maximum in self.profiler.report():
+            lines.append("%-34s %8.3f %8.3f %8.3f" % (name, p50 * 1000, p95 * 1000, maximum * 1000))
+        for name, value in sorted(self.profiler.gauges.items()):
+            if isinstance(value, dict):
+                value = ", ".join("%s %d" % item for item in sorted(value.items()))
+            lines.append("%s: %s" % (name, value))
+        self.label.text = "\n".join(lines)
+
+    def draw(self):
+        if self.visible:
+            self.label.draw()
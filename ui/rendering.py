@@ -2,15 +2,19 @@ from world.world import World, Zone
 from vector import Vector2 as v2
 from entity import Entity
 from typing import List
+from weakref import WeakKeyDictionary
+import numpy
 import pyglet
 
+# zone geometry never changes after generation, so each world's quads are uploaded once and kept here
+_rendering_world_cache = WeakKeyDictionary()
 
-# helper method to convert to tuples
+
+# helper method to convert to tuples; world coordinates as they are, the camera does the isometric projection
 def _rendering_v2_to_tup(*v2s):
     ret = ()
     for vec in v2s:
-        iso = vec.to_iso()
-        ret += (iso.x, iso.y)
+        ret += (vec.x, vec.y)
     return ret
 
 # convert zone to v2f for rendering with opengl
@@ -23,26 +27,103 @@ def _rendering_zone_to_v2f(z: Zone):
     return _rendering_v2_to_tup(bottom_left, bottom_right, top_right, top_left)
 
 
+# every zone of one world as quads in a single vertex list; positions are static,
+# colors are only rewritten for zones marked dirty since the last draw
+class _RenderingWorldGeometry:
+    def __init__(self, world: World):
+        self.revision = world.revision
+        self.zones = list(world.zones)
+        self.zone_index = {zone: index for index, zone in enumerate(self.zones)}
+        self.dirty = set()
+        vertices = []
+        colors = []
+        for zone in self.zones:
+            vertices.extend(_rendering_zone_to_v2f(zone))
+            colors.extend(zone.color * 4)
+        self.batch = pyglet.graphics.Batch()
+        self.vertex_list = self.batch.add(4 * len(self.zones), pyglet.gl.GL_QUADS, None,
+                                          ('v2f/static', vertices),
+                                          ('c3B/dynamic', colors))
+
+    def update_colors(self):
+        if not self.dirty:
+            return
+        # fetching the array marks it for re-upload, so only touch it when something changed
+        uploaded = self.vertex_list.colors
+        for zone in self.dirty:
+            index = self.zone_index.get(zone)
+            if index is None:
+                continue
+            uploaded[index * 12:index * 12 + 12] = zone.color * 4
+        self.dirty.clear()
+
+
+def _rendering_world_geometry(world: World) -> _RenderingWorldGeometry:
+    geometry = _rendering_world_cache.get(world)
+    if geometry is None or geometry.revision != world.revision:
+        geometry = _rendering_world_cache[world] = _RenderingWorldGeometry(world)
+    return geometry
+
+
+# call after changing zone colors so the next draw uploads them
+def mark_zones_dirty(world: World, zones: List[Zone]):
+    geometry = _rendering_world_cache.get(world)
+    # nothing uploaded yet means the colors are read fresh on first draw anyway
+    if geometry is not None:
+        geometry.dirty.update(zones)
+
+
 def draw_world(world: World):
-    world_batch = pyglet.graphics.Batch()
-    for zone in world.zones:
-        # draw zones by converting them to v2f tuples
-        zone_drawing = _rendering_zone_to_v2f(zone)
-        world_batch.add(4, pyglet.gl.GL_QUADS, None,
-                        ('v2f', zone_drawing),
-                        ('c3B', zone.color * 4))
-    world_batch.draw()
-
-
-def draw_entities(entities: List[Entity]):
-    entity_batch = pyglet.graphics.Batch()
-    for entity in entities:
-        # draw entities as 10 pixel wide dots on the screen
-        pyglet.gl.glPointSize(10)
-        entity_batch.add(1, pyglet.gl.GL_POINTS, None,
-                         ('v2f', _rendering_v2_to_tup(entity.position)),
-                         ('c3B', entity.color))
-    entity_batch.draw()
+    geometry = _rendering_world_geometry(world)
+    geometry.update_colors()
+    geometry.batch.draw()
+
+
+# one stream vertex list of points shared by every entity, resized to the entity count and
+# filled in bulk from numpy rather than one vertex list per entity. positions go in as world coordinates
+class _RenderingEntityPoints:
+    def __init__(self):
+        self.count = 1
+        self.vertex_list = pyglet.graphics.vertex_list(1, 'v2f/stream', 'c3B/stream')
+
+    def update(self, positions: numpy.ndarray, colors: numpy.ndarray):
+        count = len(positions)
+        if count != self.count:
+            self.vertex_list.resize(max(count, 1))
+            self.count = count
+        if count == 0:
+            return
+        numpy.ctypeslib.as_array(self.vertex_list.vertices).reshape(-1, 2)[:count] = positions
+        numpy.ctypeslib.as_array(self.vertex_list.colors).reshape(-1, 3)[:count] = colors
+
+    def draw(self):
+        if self.count:
+            self.vertex_list.draw(pyglet.gl.GL_POINTS)
+
+
+_rendering_entity_points = None
+
+
+# draws entities as 10 pixel wide dots. given the world's physics store, positions are read straight
+# from its array and the dots follow the store's row order
+def draw_entities(entities: List[Entity], physics=None):
+    global _rendering_entity_points
+    if _rendering_entity_points is None:
+        _rendering_entity_points = _RenderingEntityPoints()
+
+    if physics is not None:
+        bodies = physics.bodies
+        positions = physics.position[:physics.count]
+    else:
+        bodies = entities
+        positions = numpy.array([(entity.position.x, entity.position.y) for entity in bodies],
+                                dtype=float).reshape(-1, 2)
+    colors = numpy.array([entity.color for entity in bodies], dtype=numpy.uint8).reshape(-1, 3)
+
+    _rendering_entity_points.update(positions, colors)
+    pyglet.gl.glPointSize(10)
+    _rendering_entity_points.draw()
+
 
 def draw_ui(screen_width, screen_height, world: World, player: Entity):
     # create ui batch
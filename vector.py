@@ -1,5 +1,7 @@
 from math import sqrt
 from enum import Enum
+from typing import List
+import numpy
 
 
 # why this instead of math.isclose?
@@ -44,6 +46,9 @@ INVERT_DIRECTION = {
 
 
 class Vector2:
+    # no per-instance dict; this is by far the most allocated type in the game
+    __slots__ = ("x", "y")
+
     def __init__(self, x: float, y: float):
         self.x = x
         self.y = y
@@ -68,35 +73,89 @@ class Vector2:
     def clone(self):
         return Vector2(self.x, self.y)
 
+    def set(self, x: float, y: float) -> 'Vector2':
+        self.x = x
+        self.y = y
+        return self
+
     def normalize(self):
         length = sqrt(self.x * self.x + self.y * self.y)
         if length == 0:
             return Vector2(0, 0)
         return Vector2(self.x / length, self.y / length)
 
+    # arithmetic skips the isinstance check: anything without x/y falls through to NotImplemented,
+    # which lets Vector2Array take over or makes python raise the usual TypeError
+
     def __add__(self, other) -> 'Vector2':
-        _vector2_check_type(other)
-        return Vector2(self.x + other.x, self.y + other.y)
+        try:
+            return Vector2(self.x + other.x, self.y + other.y)
+        except AttributeError:
+            return NotImplemented
 
     def __sub__(self, other) -> 'Vector2':
-        _vector2_check_type(other)
-        return Vector2(self.x - other.x, self.y - other.y)
+        try:
+            return Vector2(self.x - other.x, self.y - other.y)
+        except AttributeError:
+            return NotImplemented
 
     def __mul__(self, other) -> 'Vector2':
-        _vector2_check_type(other)
-        return Vector2(self.x * other.x, self.y * other.y)
+        try:
+            return Vector2(self.x * other.x, self.y * other.y)
+        except AttributeError:
+            return NotImplemented
 
     def __truediv__(self, other) -> 'Vector2':
-        _vector2_check_type(other)
-        return Vector2(self.x / other.x, self.y / other.y)
+        try:
+            return Vector2(self.x / other.x, self.y / other.y)
+        except AttributeError:
+            return NotImplemented
 
     def __floordiv__(self, other) -> 'Vector2':
-        _vector2_check_type(other)
-        return Vector2(self.x // other.x, self.y // other.y)
+        try:
+            return Vector2(self.x // other.x, self.y // other.y)
+        except AttributeError:
+            return NotImplemented
 
     def __pow__(self, other, modulo=None) -> 'Vector2':
-        _vector2_check_type(other)
-        return Vector2(self.x ** other.x, self.y ** other.y)
+        try:
+            return Vector2(self.x ** other.x, self.y ** other.y)
+        except AttributeError:
+            return NotImplemented
+
+    # in-place operators mutate and return self, so they never allocate
+
+    def __iadd__(self, other) -> 'Vector2':
+        try:
+            self.x += other.x
+            self.y += other.y
+        except AttributeError:
+            return NotImplemented
+        return self
+
+    def __isub__(self, other) -> 'Vector2':
+        try:
+            self.x -= other.x
+            self.y -= other.y
+        except AttributeError:
+            return NotImplemented
+        return self
+
+    def __imul__(self, other) -> 'Vector2':
+        try:
+            self.x *= other.x
+            self.y *= other.y
+        except AttributeError:
+            return NotImplemented
+        return self
+
+    def __itruediv__(self, other) -> 'Vector2':
+        try:
+            self.x /= other.x
+            self.y /= other.y
+        except AttributeError:
+            return NotImplemented
+        return self
 
     def __le__(self, other):
         _vector2_check_type(other)
@@ -126,3 +185,125 @@ class Vector2:
 
     def __hash__(self):
         return hash((self.x, self.y))
+
+
+# a batch of vectors backed by an (N, 2) numpy array, supporting the same maths as Vector2 over every row.
+# operands can be another Vector2Array, a single Vector2 (applied to every row), scalars or numpy arrays
+class Vector2Array:
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = numpy.asarray(data, dtype=numpy.float64).reshape(-1, 2)
+
+    @staticmethod
+    def zeros(count: int) -> 'Vector2Array':
+        return Vector2Array(numpy.zeros((count, 2)))
+
+    @staticmethod
+    def from_vectors(vectors) -> 'Vector2Array':
+        return Vector2Array([(vector.x, vector.y) for vector in vectors])
+
+    def to_vectors(self) -> List[Vector2]:
+        return [Vector2(x, y) for x, y in self.data.tolist()]
+
+    @property
+    def xs(self) -> numpy.ndarray:
+        return self.data[:, 0]
+
+    @property
+    def ys(self) -> numpy.ndarray:
+        return self.data[:, 1]
+
+    def distance(self, other, squared=False) -> numpy.ndarray:
+        delta = _vector2_array_operand(other) - self.data
+        squares = numpy.einsum("ij,ij->i", delta, delta)
+        return squares if squared else numpy.sqrt(squares)
+
+    def length(self) -> numpy.ndarray:
+        return numpy.sqrt(numpy.einsum("ij,ij->i", self.data, self.data))
+
+    def to_iso(self) -> 'Vector2Array':
+        x, y = self.data[:, 0], self.data[:, 1]
+        return Vector2Array(numpy.column_stack((x - y, (x + y) / 2)))
+
+    def to_2d(self) -> 'Vector2Array':
+        x, y = self.data[:, 0], self.data[:, 1]
+        return Vector2Array(numpy.column_stack(((2 * y + x) / 2, (2 * y - x) / 2)))
+
+    def normalize(self) -> 'Vector2Array':
+        length = self.length()
+        # zero vectors stay zero, like Vector2.normalize
+        length[length == 0] = 1
+        return Vector2Array(self.data / length[:, None])
+
+    def clone(self) -> 'Vector2Array':
+        return Vector2Array(self.data.copy())
+
+    def __add__(self, other) -> 'Vector2Array':
+        return Vector2Array(self.data + _vector2_array_operand(other))
+
+    def __sub__(self, other) -> 'Vector2Array':
+        return Vector2Array(self.data - _vector2_array_operand(other))
+
+    def __mul__(self, other) -> 'Vector2Array':
+        return Vector2Array(self.data * _vector2_array_operand(other))
+
+    def __truediv__(self, other) -> 'Vector2Array':
+        return Vector2Array(self.data / _vector2_array_operand(other))
+
+    def __radd__(self, other) -> 'Vector2Array':
+        return Vector2Array(_vector2_array_operand(other) + self.data)
+
+    def __rsub__(self, other) -> 'Vector2Array':
+        return Vector2Array(_vector2_array_operand(other) - self.data)
+
+    def __rmul__(self, other) -> 'Vector2Array':
+        return Vector2Array(_vector2_array_operand(other) * self.data)
+
+    def __rtruediv__(self, other) -> 'Vector2Array':
+        return Vector2Array(_vector2_array_operand(other) / self.data)
+
+    def __iadd__(self, other) -> 'Vector2Array':
+        self.data += _vector2_array_operand(other)
+        return self
+
+    def __isub__(self, other) -> 'Vector2Array':
+        self.data -= _vector2_array_operand(other)
+        return self
+
+    def __imul__(self, other) -> 'Vector2Array':
+        self.data *= _vector2_array_operand(other)
+        return self
+
+    def __itruediv__(self, other) -> 'Vector2Array':
+        self.data /= _vector2_array_operand(other)
+        return self
+
+    def __neg__(self) -> 'Vector2Array':
+        return Vector2Array(-self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            x, y = self.data[index].tolist()
+            return Vector2(x, y)
+        return Vector2Array(self.data[index])
+
+    def __setitem__(self, index, value):
+        self.data[index] = _vector2_array_operand(value)
+
+    def __iter__(self):
+        return iter(self.to_vectors())
+
+    def __repr__(self):
+        return "Vector2Array(%d)" % len(self.data)
+
+
+def _vector2_array_operand(other):
+    if isinstance(other, Vector2Array):
+        return other.data
+    if isinstance(other, Vector2):
+        return numpy.array((other.x, other.y))
+    return other
@@ -0,0 +1,96 @@
+from typing import List, Optional, Tuple
+
+# (slot, generation); a slot's generation moves on every time it's freed, so handles of removed entities go stale
+Handle = Tuple[int, int]
+
+
+# the world's entities in a dense list for iteration, plus a slot table that backs generational handles.
+# removal swaps the last entity into the hole, adds made while the world is ticking wait until flush(),
+# and entities that drop to 0 health mark themselves so the sweep only looks at those
+class EntityList:
+    def __init__(self):
+        self.dense = list()
+        self._slots = list()
+        self._generations = list()
+        self._free_slots = list()
+        self._pending = list()
+        self._dying = list()
+        self.deferring = False
+
+    # hands the entity a handle; returns False if it's only queued until the next flush()
+    def add(self, entity) -> bool:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = len(self._slots)
+            self._slots.append(None)
+            self._generations.append(0)
+        self._slots[slot] = entity
+        entity.handle = (slot, self._generations[slot])
+        if self.deferring:
+            self._pending.append(entity)
+            return False
+        self._entities_insert(entity)
+        return True
+
+    # moves queued entities into the dense list and returns them
+    def flush(self) -> List:
+        pending, self._pending = self._pending, list()
+        # anything removed while it was still queued has lost its handle already
+        pending = [entity for entity in pending if entity.handle is not None]
+        for entity in pending:
+            self._entities_insert(entity)
+        return pending
+
+    def remove(self, entity):
+        handle = entity.handle
+        if handle is None or self.get(handle) is not entity:
+            return
+        slot, generation = handle
+        index = entity.entity_index
+        if index >= 0:
+            last = self.dense.pop()
+            if last is not entity:
+                self.dense[index] = last
+                last.entity_index = index
+        self._slots[slot] = None
+        self._generations[slot] = generation + 1
+        self._free_slots.append(slot)
+        entity.handle = None
+        entity.entity_index = -1
+
+    def get(self, handle: Handle) -> Optional[object]:
+        slot, generation = handle
+        if slot >= len(self._slots) or self._generations[slot] != generation:
+            return None
+        return self._slots[slot]
+
+    # queues an entity for the next sweep; duplicates are fine, take_dying() callers re-check
+    def mark_dying(self, entity):
+        self._dying.append(entity)
+
+    def take_dying(self) -> List:
+        dying, self._dying = self._dying, list()
+        return dying
+
+    def clear(self):
+        for entity in self.dense[::-1] + self._pending:
+            self.remove(entity)
+        self._pending.clear()
+        self._dying.clear()
+
+    def _entities_insert(self, entity):
+        entity.entity_index = len(self.dense)
+        self.dense.append(entity)
+
+    def __contains__(self, entity) -> bool:
+        return entity.handle is not None and self.get(entity.handle) is entity
+
+    def __getitem__(self, index):
+        return self.dense[index]
+
+    def __iter__(self):
+        return iter(self.dense)
+
+    def __len__(self):
+        return len(self.dense)
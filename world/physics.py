@@ -0,0 +1,135 @@
+from vector import Vector2
+import numpy
+
+
+# a vector over one row of a PhysicsStore array, what attached bodies hand out for their physics attributes,
+# so in-place changes (entity.velocity.x = 0, entity.position += step) land in the store.
+# it goes through the body on every access, since rows move on swap-remove and arrays are replaced on growth
+class PhysicsVector(Vector2):
+    __slots__ = ("body", "name")
+
+    def __init__(self, body, name: str):
+        self.body = body
+        self.name = name
+
+    @property
+    def x(self) -> float:
+        return getattr(self.body.physics_store, self.name)[self.body.physics_row, 0].item()
+
+    @x.setter
+    def x(self, value: float):
+        getattr(self.body.physics_store, self.name)[self.body.physics_row, 0] = value
+
+    @property
+    def y(self) -> float:
+        return getattr(self.body.physics_store, self.name)[self.body.physics_row, 1].item()
+
+    @y.setter
+    def y(self, value: float):
+        getattr(self.body.physics_store, self.name)[self.body.physics_row, 1] = value
+
+
+# assigning to an attached body's attribute copies into its row instead of replacing the view
+def _physics_property(name):
+    def getter(self):
+        return self.__dict__[name]
+
+    def setter(self, value):
+        self.__dict__[name].set(value.x, value.y)
+
+    return property(getter, setter)
+
+
+# attached bodies are integrated in bulk by the store
+def _physics_skip_tick(self, dt):
+    pass
+
+
+_PHYSICS_FIELDS = ("position", "velocity", "acceleration", "maximum_speed", "drag")
+# body class -> the subclass its attached bodies are switched to, see _physics_stored_class
+_physics_classes = dict()
+
+
+# a subclass of cls with the store's properties, which bodies only take on while attached.
+# detached bodies keep plain attributes, so worlds without a store don't pay for properties on every access
+def _physics_stored_class(cls):
+    stored = _physics_classes.get(cls)
+    if stored is None:
+        namespace = {name: _physics_property(name) for name in _PHYSICS_FIELDS}
+        namespace["tick_physics"] = _physics_skip_tick
+        namespace["__module__"] = cls.__module__
+        namespace["__qualname__"] = cls.__qualname__
+        stored = _physics_classes[cls] = type(cls.__name__, (cls,), namespace)
+    return stored
+
+
+# structure-of-arrays storage for physics bodies, integrated in one vectorized step per tick.
+# attached bodies keep their rows here and read/write them through PhysicsVector views
+class PhysicsStore:
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.bodies = list()
+        self.position = numpy.zeros((capacity, 2))
+        self.velocity = numpy.zeros((capacity, 2))
+        self.acceleration = numpy.zeros((capacity, 2))
+        self.maximum_speed = numpy.zeros((capacity, 2))
+        self.drag = numpy.zeros((capacity, 2))
+
+    def attach(self, body):
+        if body.physics_store is self:
+            return
+        if body.physics_store is not None:
+            body.physics_store.detach(body)
+        if self.count == len(self.position):
+            self._grow(2 * len(self.position))
+
+        row = self.count
+        for array, name in zip(self._arrays(), _PHYSICS_FIELDS):
+            vector = body.__dict__[name]
+            array[row] = (vector.x, vector.y)
+            body.__dict__[name] = PhysicsVector(body, name)
+        self.bodies.append(body)
+        self.count += 1
+        body.physics_store = self
+        body.physics_row = row
+        body.__class__ = _physics_stored_class(type(body))
+
+    # swap-removes the body's row; the body walks away with a plain copy of its state
+    def detach(self, body):
+        row = body.physics_row
+        state = [Vector2(*array[row].tolist()) for array in self._arrays()]
+        last = self.count - 1
+        if row != last:
+            for array in self._arrays():
+                array[row] = array[last]
+            moved = self.bodies[last]
+            self.bodies[row] = moved
+            moved.physics_row = row
+        self.bodies.pop()
+        self.count -= 1
+
+        body.__class__ = type(body).__bases__[0]
+        body.physics_store = None
+        body.physics_row = -1
+        for name, vector in zip(_PHYSICS_FIELDS, state):
+            body.__dict__[name] = vector
+
+    # same integration as PhysicsBody.tick_physics, for every attached body at once
+    def integrate(self, dt):
+        count = self.count
+        velocity = self.velocity[:count]
+        new_velocity = numpy.minimum(velocity + self.acceleration[:count], self.maximum_speed[:count])
+        self.position[:count] += (velocity + new_velocity) * (0.5 * dt)
+
+    def _arrays(self):
+        return self.position, self.velocity, self.acceleration, self.maximum_speed, self.drag
+
+    def _grow(self, capacity: int):
+        for name in _PHYSICS_FIELDS:
+            old = getattr(self, name)
+            new = numpy.zeros((capacity, 2))
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,65 @@
+from shape import Rectangle
+from math import floor
+from operator import itemgetter
+from typing import List
+import numpy
+
+
+# uniform grid of the non-projectile entities, rebuilt once per world tick and only queried during that tick;
+# entities spawned meanwhile aren't in the list until the tick is over, so nothing can be missing from it.
+# queries are padded so entities that moved since the rebuild are still found,
+# and results come back in the same order as the entity list
+class SpatialHash:
+    def __init__(self, cell_size=32):
+        self.cell_size = cell_size
+        # how far a hashed entity can get from where it was binned within the tick
+        self.padding = 0.0
+        self.cells = dict()
+
+    # dt is the tick about to run; nothing moves faster than its maximum speed, so that bounds the padding
+    def rebuild(self, entities: list, physics=None, dt=0.0):
+        cells = dict()
+        cell_size = self.cell_size
+        fastest = 0.0
+        # with a physics store, bin every row at once instead of reading positions one entity at a time
+        stored_cells = None
+        if physics is not None:
+            stored_cells = numpy.floor(physics.position[:physics.count] / cell_size).astype(int).tolist()
+        for order, entity in enumerate(entities):
+            if entity.is_projectile:
+                continue
+            if stored_cells is not None and entity.physics_store is physics:
+                # stored bodies are only integrated after every entity has ticked, so they don't move in between
+                key = tuple(stored_cells[entity.physics_row])
+            else:
+                key = (int(floor(entity.position.x / cell_size)), int(floor(entity.position.y / cell_size)))
+                maximum = entity.maximum_speed
+                fastest = max(fastest, abs(maximum.x), abs(maximum.y))
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [(order, entity)]
+            else:
+                bucket.append((order, entity))
+        self.cells = cells
+        self.padding = fastest * dt
+
+    # every non-projectile entity whose position is inside box
+    def query(self, box: Rectangle) -> List:
+        cell_size = self.cell_size
+        x0 = int(floor((box.bottom_left.x - self.padding) / cell_size))
+        y0 = int(floor((box.bottom_left.y - self.padding) / cell_size))
+        x1 = int(floor((box.top_right.x + self.padding) / cell_size))
+        y1 = int(floor((box.top_right.y + self.padding) / cell_size))
+
+        hits = []
+        for cell_x in range(x0, x1 + 1):
+            for cell_y in range(y0, y1 + 1):
+                bucket = self.cells.get((cell_x, cell_y))
+                if bucket is None:
+                    continue
+                for order, entity in bucket:
+                    if entity.position in box:
+                        hits.append((order, entity))
+
+        hits.sort(key=itemgetter(0))
+        return [entity for _, entity in hits]
@@ -0,0 +1,319 @@
+from vector import Vector2, Direction
+from world.world import World, Zone
+from world.worldgen import _WORLDGEN_OFFSET, _worldgen_has_collision, _worldgen_round
+from collections import OrderedDict
+from math import floor, ceil
+from random import Random
+import logging
+import numpy
+
+_log = logging.getLogger(__name__)
+
+# (dx, dy) to the neighbouring chunk on each side
+_STREAMING_SIDES = {
+    Direction.EAST: (1, 0),
+    Direction.WEST: (-1, 0),
+    Direction.NORTH: (0, 1),
+    Direction.SOUTH: (0, -1)
+}
+
+
+# one chunk_size x chunk_size square of a streaming world: a hub room in the middle, a corridor from the hub to
+# each side and a few rooms hanging off those, plus the zone raster of just this square
+class Chunk:
+    def __init__(self, key: tuple, origin: Vector2, zones: list, corridors: dict, zone_map: numpy.ndarray):
+        self.key = key
+        self.origin = origin
+        self.zones = zones
+        # the corridor ending on each side, to be joined up with the neighbouring chunk's
+        self.corridors = corridors
+        self.zone_map = zone_map
+
+
+# a world of chunks generated around the player and other active entities as they move, and dropped again
+# (least recently needed first) once the loaded area grows past max_chunks. every chunk comes from its own seed,
+# so a dropped chunk looks exactly the same when it's regenerated.
+# the zones and zone raster only cover what's loaded. loading or dropping chunks only rewrites their own squares of the
+# raster, and logs them through World.changes so the per-world caches (raycasting, path cache, flow fields, ...)
+# can patch just those squares rather than start over
+class StreamingWorld(World):
+    def __init__(self, seed=0, chunk_size=640, radius=1, max_chunks=25, rooms_per_chunk=4,
+                 min_size=Vector2(150, 150), max_size=Vector2(300, 300), corridor_width=50, round_to=50,
+                 stream_every=15, entity_store=False):
+        self.seed = seed
+        self.chunk_size = chunk_size
+        # chunks kept around every active entity's own chunk
+        self.radius = radius
+        self.max_chunks = max_chunks
+        self.rooms_per_chunk = rooms_per_chunk
+        self.min_size = min_size
+        self.max_size = max_size
+        self.corridor_width = corridor_width
+        self.round_to = round_to
+        self.stream_every = stream_every
+        self.chunks = OrderedDict()
+        self.zone_map = None
+        self.min_pos = Vector2(0, 0)
+        self.max_pos = Vector2(0, 0)
+        # zone -> its index in zones and id in the raster
+        self._zone_ids = dict()
+        super(StreamingWorld, self).__init__([], entity_store=entity_store)
+
+    def tick_world(self, dt):
+        if self.tick_count % self.stream_every == 0:
+            self.stream()
+        super(StreamingWorld, self).tick_world(dt)
+
+    # loads the chunks around every non-projectile entity and evicts what's over budget
+    def stream(self):
+        wanted = set()
+        for entity in self.entities:
+            if not entity.is_projectile:
+                wanted.update(self._streaming_around(entity.position))
+        if wanted:
+            loaded, evicted = self._streaming_load(wanted)
+            if loaded or evicted:
+                self._streaming_update(loaded, evicted)
+
+    # middle of the origin chunk's hub, which is always walkable
+    def spawn_point(self) -> Vector2:
+        return self.chunks[(0, 0)].zones[0].center()
+
+    def chunk_key(self, point: Vector2) -> tuple:
+        return int(floor(point.x / self.chunk_size)), int(floor(point.y / self.chunk_size))
+
+    def _streaming_around(self, point: Vector2) -> list:
+        cx, cy = self.chunk_key(point)
+        return [(cx + dx, cy + dy) for dx in range(-self.radius, self.radius + 1)
+                for dy in range(-self.radius, self.radius + 1)]
+
+    # returns the keys of the chunks it loaded and the chunks it evicted
+    def _streaming_load(self, wanted) -> tuple:
+        loaded = []
+        evicted = []
+        for key in sorted(wanted):
+            if key in self.chunks:
+                self.chunks.move_to_end(key)
+                continue
+            chunk = self.chunks[key] = self._streaming_generate(key)
+            self._streaming_link(chunk)
+            loaded.append(key)
+        # wanted chunks were just moved to the back, so the front holds the ones needed longest ago.
+        # the raster spans the bounding box of everything loaded, so that's what the budget is held against.
+        # the budget never evicts a wanted chunk, so spread out or crowded worlds can go over it
+        while self._streaming_area() > self.max_chunks:
+            key = next(iter(self.chunks))
+            if key in wanted:
+                break
+            chunk = self.chunks.pop(key)
+            self._streaming_unlink(chunk)
+            evicted.append(chunk)
+        return loaded, evicted
+
+    # chunks covered by the bounding box of the loaded ones
+    def _streaming_area(self) -> int:
+        xs = [key[0] for key in self.chunks]
+        ys = [key[1] for key in self.chunks]
+        return (max(xs) - min(xs) + 1) * (max(ys) - min(ys) + 1)
+
+    def _streaming_link(self, chunk: Chunk):
+        for direction, (dx, dy) in _STREAMING_SIDES.items():
+            other = self.chunks.get((chunk.key[0] + dx, chunk.key[1] + dy))
+            if other is not None:
+                chunk.corridors[direction].neighbors[direction] = other.corridors[~direction]
+                other.corridors[~direction].neighbors[~direction] = chunk.corridors[direction]
+
+    def _streaming_unlink(self, chunk: Chunk):
+        for direction, (dx, dy) in _STREAMING_SIDES.items():
+            other = self.chunks.get((chunk.key[0] + dx, chunk.key[1] + dy))
+            if other is not None:
+                other.corridors[~direction].neighbors[~direction] = None
+
+    # brings zones and the zone raster in line with the loaded chunks, touching only the squares that changed.
+    # evicted zones are swap-removed so every other zone keeps its id, apart from the ones moved into the gaps.
+    # when the bounding box of the loaded chunks moves the raster is reallocated, copying over what it still covers
+    def _streaming_update(self, loaded: list, evicted: list):
+        size = self.chunk_size
+        # a fresh list, so code holding on to the old one (a navmesh mid-search) never sees it change
+        zones = list(self.zones)
+        zone_ids = self._zone_ids
+        old_map = self.zone_map
+
+        for chunk in evicted:
+            for zone in chunk.zones:
+                zone_id = zone_ids.pop(zone)
+                last = zones.pop()
+                if last is not zone:
+                    # zones never overlap, so the whole rectangle is the moved zone's
+                    zones[zone_id] = last
+                    zone_ids[last] = zone_id
+                    self._streaming_zone_block(old_map, last)[:] = zone_id
+        # only cleared once every zone has moved, as a zone moved above may be from a later evicted chunk
+        for chunk in evicted:
+            self._streaming_block(old_map, self.min_pos, chunk.origin)[:] = -1
+
+        keys = list(self.chunks)
+        min_pos = Vector2(min(key[0] for key in keys) * size, min(key[1] for key in keys) * size)
+        max_pos = Vector2((max(key[0] for key in keys) + 1) * size, (max(key[1] for key in keys) + 1) * size)
+        zone_map = old_map
+        if old_map is None or min_pos != self.min_pos or max_pos != self.max_pos:
+            zone_map = self._streaming_reframe(old_map, min_pos, max_pos)
+
+        for key in loaded:
+            chunk = self.chunks[key]
+            base = len(zones)
+            for zone_id, zone in enumerate(chunk.zones):
+                zone_ids[zone] = base + zone_id
+            zones.extend(chunk.zones)
+            block = self._streaming_block(zone_map, min_pos, chunk.origin)
+            numpy.add(chunk.zone_map, base, out=block, where=chunk.zone_map >= 0)
+            block[chunk.zone_map < 0] = -1
+
+        self.min_pos = min_pos
+        self.max_pos = max_pos
+        self.zones = zones
+        self.zone_map = zone_map
+        squares = [chunk.origin for chunk in evicted] + [self.chunks[key].origin for key in loaded]
+        self._world_changed([(origin, origin + Vector2(size, size)) for origin in squares])
+        _log.debug("streamed %d chunks (%d in, %d out), %d zones, raster %s", len(keys), len(loaded), len(evicted),
+                   len(zones), zone_map.shape)
+
+    # a raster over min_pos to max_pos holding whatever old_map had there, -1 elsewhere.
+    # evicted squares are already cleared, so the overlap is copied in one go and only the rest is filled
+    def _streaming_reframe(self, old_map: numpy.ndarray, min_pos: Vector2, max_pos: Vector2) -> numpy.ndarray:
+        height, width = int(max_pos.y - min_pos.y), int(max_pos.x - min_pos.x)
+        if old_map is None:
+            return numpy.full((height, width), -1, dtype=numpy.int16)
+        zone_map = numpy.empty((height, width), dtype=numpy.int16)
+        x0 = int(max(min_pos.x, self.min_pos.x) - min_pos.x)
+        y0 = int(max(min_pos.y, self.min_pos.y) - min_pos.y)
+        x1 = max(int(min(max_pos.x, self.max_pos.x) - min_pos.x), x0)
+        y1 = max(int(min(max_pos.y, self.max_pos.y) - min_pos.y), y0)
+        dx = int(min_pos.x - self.min_pos.x)
+        dy = int(min_pos.y - self.min_pos.y)
+        zone_map[y0:y1, x0:x1] = old_map[y0 + dy:y1 + dy, x0 + dx:x1 + dx]
+        zone_map[:y0] = -1
+        zone_map[y1:] = -1
+        zone_map[y0:y1, :x0] = -1
+        zone_map[y0:y1, x1:] = -1
+        return zone_map
+
+    # the raster square of the chunk at origin, in a raster starting at min_pos
+    def _streaming_block(self, zone_map: numpy.ndarray, min_pos: Vector2, origin: Vector2) -> numpy.ndarray:
+        x0 = int(origin.x - min_pos.x)
+        y0 = int(origin.y - min_pos.y)
+        return zone_map[y0:y0 + self.chunk_size, x0:x0 + self.chunk_size]
+
+    def _streaming_zone_block(self, zone_map: numpy.ndarray, zone: Zone) -> numpy.ndarray:
+        x0 = int(floor(zone.bottom_left.x - self.min_pos.x))
+        y0 = int(floor(zone.bottom_left.y - self.min_pos.y))
+        x1 = int(ceil(zone.top_right.x - self.min_pos.x))
+        y1 = int(ceil(zone.top_right.y - self.min_pos.y))
+        return zone_map[y0:y1, x0:x1]
+
+    # the initial map covers the chunks around the origin, where the player starts
+    def _world_generate_map(self) -> numpy.ndarray:
+        loaded, evicted = self._streaming_load(set(self._streaming_around(Vector2(0, 0))))
+        self._streaming_update(loaded, evicted)
+        return self.zone_map
+
+    def _streaming_generate(self, key: tuple) -> Chunk:
+        cx, cy = key
+        size = self.chunk_size
+        origin = Vector2(cx * size, cy * size)
+        random = Random("%d:%d:%d" % (self.seed, cx, cy))
+        name = "chunk-%d-%d" % key
+
+        # the hub is at least min_size, so corridors placed within half of that from the middle always reach it
+        limit = size - 2 * self.round_to
+        hub_width = min(_worldgen_round(random.randint(self.min_size.x, self.max_size.x), self.round_to), limit)
+        hub_height = min(_worldgen_round(random.randint(self.min_size.y, self.max_size.y), self.round_to), limit)
+        middle = size / 2
+        hub = Zone(name + "-hub", origin + Vector2(middle - hub_width / 2, middle - hub_height / 2),
+                   origin + Vector2(middle + hub_width / 2, middle + hub_height / 2))
+        zones = [hub]
+
+        width = self.corridor_width
+        corridors = dict()
+        for direction in _STREAMING_SIDES:
+            # both chunks sharing a side agree on where its corridor crosses
+            offset = self._streaming_edge_offset(key, direction)
+            if direction is Direction.EAST:
+                p1 = Vector2(hub.top_right.x, origin.y + offset)
+                p2 = Vector2(origin.x + size, origin.y + offset + width)
+            elif direction is Direction.WEST:
+                p1 = Vector2(origin.x, origin.y + offset)
+                p2 = Vector2(hub.bottom_left.x, origin.y + offset + width)
+            elif direction is Direction.NORTH:
+                p1 = Vector2(origin.x + offset, hub.top_right.y)
+                p2 = Vector2(origin.x + offset + width, origin.y + size)
+            else:
+                p1 = Vector2(origin.x + offset, origin.y)
+                p2 = Vector2(origin.x + offset + width, hub.bottom_left.y)
+            corridor = Zone("%s-%s" % (name, direction.name.lower()), p1, p2)
+            hub.neighbors[direction] = corridor
+            corridor.neighbors[~direction] = hub
+            corridors[direction] = corridor
+            zones.append(corridor)
+
+        self._streaming_add_rooms(random, origin, zones, corridors, name)
+        return Chunk(key, origin, zones, corridors, self._streaming_rasterize(origin, zones))
+
+    # where the corridor crossing a chunk side sits along it, from a seed shared by the chunks on both sides
+    def _streaming_edge_offset(self, key: tuple, direction: Direction) -> int:
+        cx, cy = key
+        if direction is Direction.EAST:
+            edge = "v:%d:%d" % (cx + 1, cy)
+        elif direction is Direction.WEST:
+            edge = "v:%d:%d" % (cx, cy)
+        elif direction is Direction.NORTH:
+            edge = "h:%d:%d" % (cx, cy + 1)
+        else:
+            edge = "h:%d:%d" % (cx, cy)
+        reach = min(self.min_size.x, self.min_size.y) / 2
+        middle = self.chunk_size / 2
+        low = int(ceil(middle - reach))
+        high = int(floor(middle + reach - self.corridor_width))
+        return Random("%d:%s" % (self.seed, edge)).randint(low, max(low, high))
+
+    # grows up to rooms_per_chunk rooms off the corridors the same way WorldGenerator does, kept inside the chunk
+    def _streaming_add_rooms(self, random: Random, origin: Vector2, zones: list, corridors: dict, name: str):
+        size = self.chunk_size
+        # a corridor's outer end is reserved for the neighbouring chunk
+        reserved = {corridor: direction for direction, corridor in corridors.items()}
+        frontier = list(corridors.values())
+        placed = 0
+        for _ in range(self.rooms_per_chunk * 8):
+            if placed == self.rooms_per_chunk or not frontier:
+                break
+            parent = random.choice(frontier)
+            open_directions = [direction for direction in parent.get_open_directions()
+                               if reserved.get(parent) is not direction]
+            if not open_directions:
+                frontier.remove(parent)
+                continue
+            direction = random.choice(open_directions)
+            room_width = _worldgen_round(random.randint(self.min_size.x, self.max_size.x), self.round_to)
+            room_height = _worldgen_round(random.randint(self.min_size.y, self.max_size.y), self.round_to)
+            bottom_left, top_right = random.choice(_WORLDGEN_OFFSET[direction])(parent, room_width, room_height, 0)
+            room = Zone("%s-room-%d" % (name, placed), bottom_left, top_right)
+            if room.bottom_left.x < origin.x or room.bottom_left.y < origin.y or \
+               room.top_right.x > origin.x + size or room.top_right.y > origin.y + size or \
+               _worldgen_has_collision(zones, room):
+                continue
+            parent.neighbors[direction] = room
+            room.neighbors[~direction] = parent
+            zones.append(room)
+            frontier.append(room)
+            placed += 1
+
+    def _streaming_rasterize(self, origin: Vector2, zones: list) -> numpy.ndarray:
+        size = self.chunk_size
+        zone_map = numpy.full((size, size), -1, dtype=numpy.int16)
+        for zone_id, zone in enumerate(zones):
+            x0 = int(floor(zone.bottom_left.x - origin.x))
+            y0 = int(floor(zone.bottom_left.y - origin.y))
+            x1 = int(ceil(zone.top_right.x - origin.x))
+            y1 = int(ceil(zone.top_right.y - origin.y))
+            zone_map[y0:y1, x0:x1] = zone_id
+        return zone_map
@@ -1,9 +1,18 @@
-from typing import List
+from typing import List, Optional, Tuple
 from vector import Vector2, Direction
 from PIL import Image
 from shape import Rectangle
+from world.spatial import SpatialHash
+from world.entities import EntityList
+from world.physics import PhysicsStore
+from profiler import profiler
+from math import floor, ceil
+from collections import deque
+from threading import Thread
+from time import perf_counter
+from weakref import WeakKeyDictionary
 import logging
-import sys
+import numpy
 
 
 _log = logging.getLogger(__name__)
@@ -44,16 +53,106 @@ class Zone(Rectangle):
 
 
 class World:
-    def __init__(self, zones: List[Zone]):
+    # zone_map takes a prebuilt raster (such as a memory-mapped one from world.worldfile) instead of building it
+    def __init__(self, zones: List[Zone], dump=False, entity_store=False, zone_map=None):
         self.zones = zones
-        self.entities = list()
-        self.real_big_same = self._world_generate_map()
-        self.dump_world()
+        self.entities = EntityList()
+        self.tick_count = 0
+        # bumped whenever zones or the zone raster change, so per-world caches know to rebuild
+        self.revision = 0
+        # (revision, areas) for the latest revisions, each area a (bottom left, top right) pair where cells may have
+        # turned walkable or not. caches of walkability use it to patch just those areas instead of starting over
+        # (see changes_since); zone ids can move anywhere, so whatever is keyed on those rebuilds on any revision
+        self.changes = deque(maxlen=64)
+        self.entity_grid = SpatialHash()
+        # optional structure-of-arrays physics for every entity in the world
+        self.physics = PhysicsStore() if entity_store else None
+        # budgeted incremental path searches, see pathfinding.get_path_scheduler
+        self.path_scheduler = None
+        # flow fields by the entity they lead to, see flowfield.get_flow_field; dropped along with their target
+        self.flow_fields = WeakKeyDictionary()
+        if zone_map is None:
+            self.zone_map = self._world_generate_map()
+        else:
+            self._world_compute_bounds()
+            self.zone_map = zone_map
+        if dump:
+            self.dump_world()
 
     def tick_world(self, dt):
+        self.tick_count += 1
+        # the profiler is only looked at once a tick, so with it off this is the plain loop without any hooks
+        if profiler.enabled:
+            self._world_tick_profiled(dt)
+            return
+        self.entity_grid.rebuild(self.entities, self.physics, dt)
+        if self.path_scheduler is not None:
+            self.path_scheduler.tick()
+        self._world_tick_entities(dt)
+        if self.physics is not None:
+            self.physics.integrate(dt)
+        self._world_sweep()
+
+    # same steps as tick_world, timed per phase and per entity class
+    def _world_tick_profiled(self, dt):
+        with profiler.phase("tick.spatial_hash"):
+            self.entity_grid.rebuild(self.entities, self.physics, dt)
+        if self.path_scheduler is not None:
+            with profiler.phase("tick.pathfinding"):
+                self.path_scheduler.tick()
+        with profiler.phase("tick.entities"):
+            self.entities.deferring = True
+            for entity in self.entities:
+                start = perf_counter()
+                entity.tick_entity(dt)
+                profiler.accumulate("tick.entity." + type(entity).__name__, perf_counter() - start)
+            self.entities.deferring = False
+        if self.physics is not None:
+            with profiler.phase("tick.physics_store"):
+                self.physics.integrate(dt)
+        with profiler.phase("tick.sweep"):
+            self._world_sweep()
+        profiler.flush()
+        self._world_count_entities()
+
+    # anything spawned meanwhile is held back so the list isn't changed under the loop
+    def _world_tick_entities(self, dt):
+        self.entities.deferring = True
         for entity in self.entities:
             entity.tick_entity(dt)
-        self.entities[:] = [entity for entity in self.entities if entity.health > 0]
+        self.entities.deferring = False
+
+    def _world_sweep(self):
+        # only entities that hit 0 health this tick are looked at; some may have been healed since
+        for entity in self.entities.take_dying():
+            if entity.health <= 0 and entity in self.entities:
+                self.remove_entity(entity)
+        for entity in self.entities.flush():
+            self._world_attach_physics(entity)
+
+    def _world_count_entities(self):
+        counts = dict()
+        for entity in self.entities:
+            name = type(entity).__name__
+            counts[name] = counts.get(name, 0) + 1
+        profiler.gauge("entities", counts)
+
+    def add_entity(self, entity):
+        entity.world = self
+        if self.entities.add(entity):
+            self._world_attach_physics(entity)
+
+    def remove_entity(self, entity):
+        self.entities.remove(entity)
+        if self.physics is not None and entity.physics_store is self.physics:
+            self.physics.detach(entity)
+        if entity.pool is not None:
+            # pooled entities go back to be reused
+            entity.pool.release(entity)
+
+    def _world_attach_physics(self, entity):
+        if self.physics is not None:
+            self.physics.attach(entity)
 
     def get_zone_containing_point(self, point: Vector2) -> Zone:
         if point.x < self.min_pos.x or point.y < self.min_pos.y or \
@@ -61,25 +160,25 @@ class World:
             return None
 
         index_x, index_y = self._world_fix_point(point)
-        return self.real_big_same[index_y][index_x]
+        zone_id = self.zone_map[index_y, index_x]
+        if zone_id < 0:
+            return None
+        return self.zones[zone_id]
 
     def get_zones(self) -> List[Zone]:
         return self.zones
 
-    def _world_generate_map(self) -> List[List[Zone]]:
-        _log.info("Starting internal map generation...")
-        self.max_pos = Vector2(sys.float_info.min, sys.float_info.min)
-        self.min_pos = Vector2(sys.float_info.max, sys.float_info.max)
+    # non-projectile entities inside box, in entity list order
+    def get_entities_in(self, box: Rectangle) -> list:
+        return self.entity_grid.query(box)
 
-        for zone in self.zones:
-            self.max_pos.x = max(zone.top_right.x, self.max_pos.x)
-            self.max_pos.y = max(zone.top_right.y, self.max_pos.y)
-
-            self.min_pos.x = min(zone.bottom_left.x, self.min_pos.x)
-            self.min_pos.y = min(zone.bottom_left.y, self.min_pos.y)
+    # builds a zone-id raster (1 unit per cell, -1 meaning outside) by filling each zone's block in one go
+    def _world_generate_map(self) -> numpy.ndarray:
+        _log.info("Starting internal map generation...")
+        self._world_compute_bounds()
 
-        rows = int(self.max_pos.x - self.min_pos.x)
-        columns = int(self.max_pos.y - self.min_pos.y)
+        rows = self.height()
+        columns = self.width()
 
         _log.setLevel(10)
         _log.debug("Using map stats:")
@@ -87,45 +186,65 @@ class World:
         _log.debug("max_pos: %s", repr(self.max_pos))
         _log.debug("rows x columns: %d x %d", rows, columns)
 
-        map = [[None for _ in range(rows)] for _ in range(columns)]  # type: List[List[Zone]]
-        for y in range(int(self.max_pos.y) - 1, int(self.min_pos.y), -1):
-            for x in range(int(self.min_pos.x), int(self.max_pos.x) - 1):
-                point = Vector2(x, y)
-                index_x, index_y = int(x + abs(self.min_pos.x)), int(y + abs(self.min_pos.y))
-                for zone in self.zones:
-                    if point in zone:
-                        map[index_y][index_x] = zone
-                        break
+        map = numpy.full((rows, columns), -1, dtype=numpy.int16)
+        for zone_id, zone in enumerate(self.zones):
+            # zones only ever share edges, so half-open blocks never overwrite each other
+            x0 = int(floor(zone.bottom_left.x - self.min_pos.x))
+            y0 = int(floor(zone.bottom_left.y - self.min_pos.y))
+            x1 = int(ceil(zone.top_right.x - self.min_pos.x))
+            y1 = int(ceil(zone.top_right.y - self.min_pos.y))
+            map[y0:y1, x0:x1] = zone_id
 
         _log.info("Finished internal map generation.")
         return map
 
+    # areas whose walkability changed after revision, or None if that isn't known any more and the caller has to rebuild
+    def changes_since(self, revision: int) -> Optional[List[Tuple[Vector2, Vector2]]]:
+        if revision == self.revision:
+            return []
+        changes = self.changes
+        if revision > self.revision or not changes or changes[0][0] > revision + 1 or changes[-1][0] != self.revision:
+            return None
+        return [area for changed, areas in changes if changed > revision for area in areas]
+
+    # for worlds that change after they're built: bumps revision and logs which areas of the raster changed
+    def _world_changed(self, areas: List[Tuple[Vector2, Vector2]]):
+        self.revision += 1
+        self.changes.append((self.revision, areas))
+
+    def _world_compute_bounds(self):
+        self.min_pos = Vector2(min(zone.bottom_left.x for zone in self.zones),
+                               min(zone.bottom_left.y for zone in self.zones))
+        self.max_pos = Vector2(max(zone.top_right.x for zone in self.zones),
+                               max(zone.top_right.y for zone in self.zones))
+
     def _world_fix_point(self, point: Vector2):
         # fixes any point into within game world bounds
-        x = int(point.x + abs(self.min_pos.x)) - 1
-        y = int(point.y + abs(self.min_pos.y)) - 1
-        if x < 0:
-            x = 0
-        if y < 0:
-            y = 0
+        x = int(floor(point.x - self.min_pos.x))
+        y = int(floor(point.y - self.min_pos.y))
+        # points sitting on the max edge belong to the last cell
+        x = min(max(x, 0), self.zone_map.shape[1] - 1)
+        y = min(max(y, 0), self.zone_map.shape[0] - 1)
         return x, y
 
-    def dump_world(self):
-        # dumps the current world as a .png file
-        img = Image.new("RGB", (self.width(), self.height()))
-        for y in range(self.height()):
-            for x in range(self.width()):
-                point = Vector2(self.max_pos.x - x, self.max_pos.y - y)
-                zone = self.get_zone_containing_point(point)
-                if zone is not None:
-                    img.putpixel((x, y), (128, 128, 128))
-        img.save("world.png")
+    def dump_world(self, path="world.png", background=False):
+        # dumps the current world as a .png file, flipped on both axes like the old per-pixel export
+        pixels = numpy.zeros((self.height(), self.width(), 3), dtype=numpy.uint8)
+        pixels[self.zone_map[::-1, ::-1] >= 0] = (128, 128, 128)
+        img = Image.fromarray(pixels, "RGB")
+        if not background:
+            img.save(path)
+            return None
+        # encoding and writing the png is left to a daemon thread so callers don't block on disk
+        thread = Thread(target=img.save, args=(path,), name="world-dump", daemon=True)
+        thread.start()
+        return thread
 
     def width(self):
-        return int(self.max_pos.x - self.min_pos.x)
+        return int(ceil(self.max_pos.x - self.min_pos.x))
 
     def height(self):
-        return int(self.max_pos.y - self.min_pos.y)
+        return int(ceil(self.max_pos.y - self.min_pos.y))
 
     def __contains__(self, point):
         return self.get_zone_containing_point(point) is not None
@@ -0,0 +1,91 @@
+from vector import Vector2, Direction
+from world.world import World, Zone
+import struct
+import numpy
+
+# little endian throughout:
+#   header   magic, version, zone count, raster width and height, byte offset of the raster
+#   zones    zone count x (bottom left x, y, top right x, y) as float64
+#   links    zone count x (north, east, south, west) neighbour ids as int32, -1 for none
+#   names    zone count x (uint16 length, utf-8 bytes)
+#   raster   height x width int16 zone ids, starting on a 64 byte boundary so it can be mapped straight in
+_WORLDFILE_MAGIC = b"RDWORLD\0"
+_WORLDFILE_VERSION = 1
+_WORLDFILE_HEADER = struct.Struct("<8sIIIIQ")
+_WORLDFILE_ALIGNMENT = 64
+_WORLDFILE_DIRECTIONS = [Direction.NORTH, Direction.EAST, Direction.SOUTH, Direction.WEST]
+
+
+# raised for files that aren't world files or don't match what their header says
+class WorldFileError(ValueError):
+    pass
+
+
+def save_world(world: World, path: str):
+    zones = world.zones
+    zone_index = {zone: index for index, zone in enumerate(zones)}
+
+    corners = numpy.array([(zone.bottom_left.x, zone.bottom_left.y, zone.top_right.x, zone.top_right.y)
+                           for zone in zones], dtype="<f8").reshape(-1, 4)
+    links = numpy.array([[zone_index.get(zone.neighbors.get(direction), -1) for direction in _WORLDFILE_DIRECTIONS]
+                         for zone in zones], dtype="<i4").reshape(-1, 4)
+    names = bytearray()
+    for zone in zones:
+        name = zone.name.encode("utf-8")
+        names += struct.pack("<H", len(name)) + name
+
+    height, width = world.zone_map.shape
+    body = corners.tobytes() + links.tobytes() + bytes(names)
+    raster_offset = _WORLDFILE_HEADER.size + len(body)
+    raster_offset += -raster_offset % _WORLDFILE_ALIGNMENT
+
+    with open(path, "wb") as file:
+        file.write(_WORLDFILE_HEADER.pack(_WORLDFILE_MAGIC, _WORLDFILE_VERSION, len(zones), width, height,
+                                          raster_offset))
+        file.write(body)
+        file.write(b"\0" * (raster_offset - _WORLDFILE_HEADER.size - len(body)))
+        file.write(numpy.ascontiguousarray(world.zone_map, dtype="<i2").tobytes())
+
+
+# zones and links are read up front; the raster is memory-mapped read-only and only paged in as it's used
+def load_world(path: str, entity_store=False) -> World:
+    with open(path, "rb") as file:
+        header = file.read(_WORLDFILE_HEADER.size)
+        if len(header) != _WORLDFILE_HEADER.size:
+            raise WorldFileError("%s: truncated header" % path)
+        magic, version, zone_count, width, height, raster_offset = _WORLDFILE_HEADER.unpack(header)
+        if magic != _WORLDFILE_MAGIC:
+            raise WorldFileError("%s: not a world file" % path)
+        if version != _WORLDFILE_VERSION:
+            raise WorldFileError("%s: unsupported version %d" % (path, version))
+
+        corners = numpy.frombuffer(_worldfile_read(file, path, zone_count * 32, "zones"), dtype="<f8").reshape(-1, 4)
+        links = numpy.frombuffer(_worldfile_read(file, path, zone_count * 16, "links"), dtype="<i4").reshape(-1, 4)
+        names = []
+        for _ in range(zone_count):
+            length, = struct.unpack("<H", _worldfile_read(file, path, 2, "names"))
+            names.append(_worldfile_read(file, path, length, "names").decode("utf-8"))
+        if file.seek(0, 2) < raster_offset + width * height * 2:
+            raise WorldFileError("%s: truncated raster" % path)
+
+    zones = [Zone(name, Vector2(x0, y0), Vector2(x1, y1)) for name, (x0, y0, x1, y1) in zip(names, corners.tolist())]
+    for zone, neighbors in zip(zones, links.tolist()):
+        for direction, neighbor in zip(_WORLDFILE_DIRECTIONS, neighbors):
+            if neighbor >= len(zones):
+                raise WorldFileError("%s: link to missing zone %d" % (path, neighbor))
+            if neighbor >= 0:
+                zone.neighbors[direction] = zones[neighbor]
+
+    zone_map = numpy.memmap(path, dtype="<i2", mode="r", offset=raster_offset, shape=(height, width))
+    world = World(zones, entity_store=entity_store, zone_map=zone_map)
+    if world.zone_map.shape != (world.height(), world.width()):
+        raise WorldFileError("%s: raster is %dx%d but the zones span %dx%d" % (path, width, height,
+                                                                              world.width(), world.height()))
+    return world
+
+
+def _worldfile_read(file, path: str, size: int, section: str) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise WorldFileError("%s: truncated %s" % (path, section))
+    return data
@@ -1,24 +1,41 @@
 from vector import Vector2 as v2, Direction
 from world.world import World, Zone
-from random import randint, choice
+from random import randint, choice, randrange
+from math import floor
 from typing import List
 import logging
 
 _log = logging.getLogger(__name__)
 
 
+# raised when the rooms asked for can't be placed
+class WorldGenerationError(RuntimeError):
+    pass
+
+
 class WorldGenerator:
     def __init__(self, room_count: int,
                  min_size: v2, max_size: v2,
-                 round_to: int):
+                 round_to: int, max_attempts=1000, parent_attempts=12, frontier_only=False):
         self.count = room_count
         self.min_size = min_size
         self.max_size = max_size
         self.round_to = round_to
-
-    def generate(self) -> World:
+        # failed placements in a row before giving up, and per parent before it's taken off the frontier
+        self.max_attempts = max_attempts
+        self.parent_attempts = parent_attempts
+        # draw parents only from zones that can still grow; faster on crowded layouts, but rooms spread
+        # differently than the default uniform pick over every zone, so the same seed gives another world
+        self.frontier_only = frontier_only
+
+    def generate(self, entity_store=False) -> World:
         _log.info("Starting world generation...")
         zones = []
+        # zones that may still take a neighbor; with frontier_only, parents are only ever picked from here
+        frontier = []
+        parent_failures = dict()
+        placed = _WorldgenIndex(_worldgen_round(max(self.max_size.x, self.max_size.y), self.round_to))
+        failures = 0
         zones_left = self.count
 
         while zones_left > 0:
@@ -29,6 +46,12 @@ class WorldGenerator:
                                    _worldgen_round(self.min_size.y * 0.75, self.round_to))
                 generated_zone = Zone("starting-room", gen_bottom_left, gen_top_right)
             else:
+                if self.frontier_only and not frontier:
+                    raise WorldGenerationError("no room left to grow from after placing %d of %d rooms"
+                                               % (len(zones), self.count))
+                if failures >= self.max_attempts:
+                    raise WorldGenerationError("gave up after %d failed placements in a row, placed %d of %d rooms"
+                                               % (failures, len(zones), self.count))
                 gen_width = _worldgen_round(randint(self.min_size.x, self.max_size.x), self.round_to)
                 gen_height = _worldgen_round(randint(self.min_size.y, self.max_size.y), self.round_to)
                 # legacy docs below: pypy doesn't have a 3.6 version, so choices() doesn't exist
@@ -38,26 +61,72 @@ class WorldGenerator:
                 # why to the 10th? I want a significantly less chance of it picking a zone with 3 neighbors as opposed
                 # to one with just 1 neighbor. obviously, I should probably just use squared or something
                 # but I really _really_ don't want 4-way corridors.
-                random_parent_zone = choice(zones)
-                open_directions = random_parent_zone.get_open_directions()
-                if not open_directions:
-                    continue
-                random_direction = choice(open_directions)
+                if self.frontier_only:
+                    parent_index = randrange(len(frontier))
+                    random_parent_zone = frontier[parent_index]
+                else:
+                    random_parent_zone = choice(zones)
+                    if not random_parent_zone.get_open_directions():
+                        failures += 1
+                        continue
+                random_direction = choice(random_parent_zone.get_open_directions())
                 offset_func = choice(_WORLDGEN_OFFSET[random_direction])
                 bottom_left, top_right = offset_func(random_parent_zone, gen_width, gen_height, 0)
 
                 generated_zone = Zone("zone-%d" % (self.count - zones_left), bottom_left, top_right)
                 # if we generated an overlap, just discard it and generate another one
-                if _worldgen_has_collision(zones, generated_zone):
+                if placed.collides(generated_zone):
+                    failures += 1
+                    parent_failures[random_parent_zone] = parent_failures.get(random_parent_zone, 0) + 1
+                    # boxed in on every open side, most likely
+                    if self.frontier_only and parent_failures[random_parent_zone] >= self.parent_attempts:
+                        _worldgen_swap_remove(frontier, parent_index)
                     continue
                 random_parent_zone.neighbors[random_direction] = generated_zone
                 generated_zone.neighbors[~random_direction] = random_parent_zone
+                if self.frontier_only and not random_parent_zone.get_open_directions():
+                    _worldgen_swap_remove(frontier, parent_index)
 
+            failures = 0
             zones.append(generated_zone)
+            if self.frontier_only:
+                frontier.append(generated_zone)
+            placed.insert(generated_zone)
             zones_left -= 1
 
         _log.info("Finished world generation!")
-        return World(zones)
+        return World(zones, entity_store=entity_store)
+
+
+# coarse grid over the placed zones, so overlap tests only look at zones in the cells a candidate covers
+class _WorldgenIndex:
+    def __init__(self, cell_size: int):
+        self.cell_size = cell_size
+        self.cells = dict()
+
+    def _cells(self, zone: Zone):
+        x0 = int(floor(zone.bottom_left.x / self.cell_size))
+        y0 = int(floor(zone.bottom_left.y / self.cell_size))
+        x1 = int(floor(zone.top_right.x / self.cell_size))
+        y1 = int(floor(zone.top_right.y / self.cell_size))
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield x, y
+
+    def insert(self, zone: Zone):
+        for key in self._cells(zone):
+            bucket = self.cells.get(key)
+            if bucket is None:
+                self.cells[key] = [zone]
+            else:
+                bucket.append(zone)
+
+    def collides(self, zone: Zone) -> bool:
+        for key in self._cells(zone):
+            bucket = self.cells.get(key)
+            if bucket is not None and _worldgen_has_collision(bucket, zone):
+                return True
+        return False
 
 
 # rounds to nearest "to"
@@ -73,6 +142,13 @@ def _worldgen_has_collision(zones: List[Zone], zone: Zone):
     return False
 
 
+# removes items[index] in O(1) by moving the last item into its place
+def _worldgen_swap_remove(items: list, index: int):
+    last = items.pop()
+    if index < len(items):
+        items[index] = last
+
+
 # Here be dragons. All offset functions.
 
 def _worldgen_offset_n_l(z: Zone, new_width: int, new_height: int, offset: int):